@@ -1,84 +1,206 @@
 #!/usr/bin/env python3
 """
-Script para limpar todos os bancos de dados do Ashen Network
-Uso: python3 clear_database.py
+Script para limpar, salvar e restaurar os bancos de dados do Ashen Network
+
+Uso interativo:
+    python3 clear_database.py
+
+Uso não interativo (CI, testes de carga):
+    python3 clear_database.py truncate              # limpa os dados e compacta (VACUUM)
+    python3 clear_database.py snapshot --name base  # salva o estado atual
+    python3 clear_database.py restore --name base   # volta ao estado salvo
+    python3 clear_database.py list                  # lista os snapshots
+    python3 clear_database.py remove --yes          # apaga os arquivos de banco
+
+Todos os comandos aceitam --db {all,characters,guilds} e tratam os dois bancos
+em paralelo, informando o tempo de cada etapa.
 """
 
+import argparse
 import os
 import sqlite3
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+# Banco -> (arquivo, tabelas na ordem de limpeza)
+DATABASES = {
+    'characters': ('dark_souls.db', ['character_items', 'characters', 'items']),
+    'guilds': ('guilds.db', ['guild_members', 'guilds', 'guild_changes']),
+}
+
+# Registro de alterações: as linhas são apagadas, mas a versão nunca volta. A
+# limpeza entra como uma alteração 'resync' para os consumidores do feed
+CHANGE_LOG_TABLE = 'guild_changes'
+
+# Índices FTS5 de conteúdo externo: esvaziados de uma vez com 'delete-all'
+FTS_TABLES = ['guilds_fts']
+
+
+def db_path(name, data_dir=DATA_DIR):
+    return os.path.join(data_dir, DATABASES[name][0])
+
+
+def snapshot_dir(snapshot, data_dir=DATA_DIR):
+    return os.path.join(data_dir, 'snapshots', snapshot)
+
+
+def elapsed_ms(started):
+    return (time.perf_counter() - started) * 1000.0
+
+
+def existing_tables(conn):
+    return {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+
+
+def table_triggers(conn, tables):
+    """Triggers das tabelas, com o DDL para recriá-los"""
+    placeholders = ','.join('?' * len(tables))
+    return conn.execute(
+        f"SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND tbl_name IN ({placeholders})",
+        tables).fetchall()
+
+
+def truncate_db(name, data_dir=DATA_DIR, compact=True):
+    """Apaga os dados das tabelas, zera os auto-incrementos e compacta o arquivo"""
+    path = db_path(name, data_dir)
+    if not os.path.exists(path):
+        return f"ℹ️  {name}: banco não existe ainda"
+
+    started = time.perf_counter()
+    conn = sqlite3.connect(path, isolation_level=None)
+    try:
+        present = existing_tables(conn)
+        tables = [t for t in DATABASES[name][1] if t in present]
+        conn.execute('BEGIN IMMEDIATE')
+        # Triggers por linha (member_count, FTS, registro de alterações) impedem o
+        # DELETE sem WHERE de usar o atalho de truncate do SQLite: ficam fora
+        # durante a limpeza e voltam na mesma transação
+        triggers = table_triggers(conn, tables) if tables else []
+        for trigger, _ in triggers:
+            conn.execute(f'DROP TRIGGER {trigger}')
+        for table in tables:
+            conn.execute(f'DELETE FROM {table}')
+        for fts in FTS_TABLES:
+            if fts in present:
+                conn.execute(f"INSERT INTO {fts} ({fts}) VALUES ('delete-all')")
+        for _, ddl in triggers:
+            conn.execute(ddl)
+        if 'sqlite_sequence' in existing_tables(conn):
+            reset = [t for t in DATABASES[name][1] if t != CHANGE_LOG_TABLE]
+            placeholders = ','.join('?' * len(reset))
+            conn.execute(f'DELETE FROM sqlite_sequence WHERE name IN ({placeholders})', reset)
+        if CHANGE_LOG_TABLE in tables:
+            conn.execute(f"INSERT INTO {CHANGE_LOG_TABLE} (type) VALUES ('resync')")
+        conn.execute('COMMIT')
+        cleared = elapsed_ms(started)
+
+        if compact:
+            conn.execute('VACUUM')
+            # Em modo WAL o arquivo -wal também precisa ser truncado
+            conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    finally:
+        conn.close()
+    return f"✅ {name}: dados limpos em {cleared:.1f} ms, total com compactação {elapsed_ms(started):.1f} ms"
+
+
+def copy_database(source_path, target_path):
+    """Copia um banco inteiro com a API de backup do SQLite (consistente mesmo com o banco em uso)"""
+    source = sqlite3.connect(source_path)
+    target = sqlite3.connect(target_path)
+    try:
+        source.backup(target)
+    finally:
+        target.close()
+        source.close()
+
+
+def snapshot_db(name, snapshot, data_dir=DATA_DIR):
+    """Salva o banco em data/snapshots/<snapshot>/"""
+    path = db_path(name, data_dir)
+    if not os.path.exists(path):
+        return f"ℹ️  {name}: banco não existe ainda, nada a salvar"
+
+    started = time.perf_counter()
+    directory = snapshot_dir(snapshot, data_dir)
+    os.makedirs(directory, exist_ok=True)
+    target = os.path.join(directory, DATABASES[name][0])
+    if os.path.exists(target):
+        os.remove(target)
+    copy_database(path, target)
+    return f"📸 {name}: snapshot '{snapshot}' salvo em {elapsed_ms(started):.1f} ms"
+
+
+def restore_db(name, snapshot, data_dir=DATA_DIR):
+    """Restaura o banco a partir de data/snapshots/<snapshot>/"""
+    source = os.path.join(snapshot_dir(snapshot, data_dir), DATABASES[name][0])
+    if not os.path.exists(source):
+        return f"ℹ️  {name}: snapshot '{snapshot}' não contém este banco"
+
+    started = time.perf_counter()
+    copy_database(source, db_path(name, data_dir))
+    return f"♻️  {name}: snapshot '{snapshot}' restaurado em {elapsed_ms(started):.1f} ms"
+
+
+def run_parallel(function, names, *args):
+    """Executa 'function' para cada banco em paralelo e imprime os resultados"""
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(names)) as pool:
+        for message in pool.map(lambda name: function(name, *args), names):
+            print(message)
+    print(f"⏱️  Tempo total: {elapsed_ms(started):.1f} ms")
+
+
+def list_snapshots(data_dir=DATA_DIR):
+    root = os.path.join(data_dir, 'snapshots')
+    names = sorted(os.listdir(root)) if os.path.isdir(root) else []
+    if not names:
+        print("ℹ️  Nenhum snapshot salvo")
+    for snapshot in names:
+        files = sorted(os.listdir(os.path.join(root, snapshot)))
+        print(f"📸 {snapshot}: {', '.join(files) or '(vazio)'}")
+
 
 def clear_characters_db():
     """Limpa o banco de personagens"""
-    db_path = os.path.join('data', 'dark_souls.db')
-    
-    if os.path.exists(db_path):
-        print(f"🗑️  Limpando banco de personagens: {db_path}")
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        
-        # Limpar tabelas
-        cursor.execute('DELETE FROM character_items')
-        cursor.execute('DELETE FROM characters')
-        cursor.execute('DELETE FROM items')
-        
-        # Reset auto-increment
-        cursor.execute("DELETE FROM sqlite_sequence WHERE name IN ('characters', 'items', 'character_items')")
-        
-        conn.commit()
-        conn.close()
-        print("✅ Banco de personagens limpo!")
-    else:
-        print("ℹ️  Banco de personagens não existe ainda")
+    print(f"🗑️  Limpando banco de personagens: {db_path('characters')}")
+    print(truncate_db('characters'))
+
 
 def clear_guilds_db():
     """Limpa o banco de guildas"""
-    db_path = os.path.join('data', 'guilds.db')
-    
-    if os.path.exists(db_path):
-        print(f"🗑️  Limpando banco de guildas: {db_path}")
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        
-        # Limpar tabelas
-        cursor.execute('DELETE FROM guild_members')
-        cursor.execute('DELETE FROM guilds')
-        
-        # Reset auto-increment
-        cursor.execute("DELETE FROM sqlite_sequence WHERE name IN ('guilds', 'guild_members')")
-        
-        conn.commit()
-        conn.close()
-        print("✅ Banco de guildas limpo!")
-    else:
-        print("ℹ️  Banco de guildas não existe ainda")
+    print(f"🗑️  Limpando banco de guildas: {db_path('guilds')}")
+    print(truncate_db('guilds'))
 
-def remove_databases():
+
+def remove_databases(names=tuple(DATABASES), data_dir=DATA_DIR):
     """Remove completamente os arquivos de banco"""
-    databases = [
-        'data/dark_souls.db',
-        'data/guilds.db'
-    ]
-    
-    for db_path in databases:
-        if os.path.exists(db_path):
-            os.remove(db_path)
-            print(f"🗑️  Arquivo removido: {db_path}")
-        else:
-            print(f"ℹ️  Arquivo não existe: {db_path}")
+    for name in names:
+        path = db_path(name, data_dir)
+        # Inclui os arquivos auxiliares do modo WAL
+        for file_path in (path, path + '-wal', path + '-shm'):
+            if os.path.exists(file_path):
+                os.remove(file_path)
+                print(f"🗑️  Arquivo removido: {file_path}")
+            elif file_path == path:
+                print(f"ℹ️  Arquivo não existe: {file_path}")
 
-def main():
+
+def interactive():
     print("🏰 === Ashen Network Database Cleaner ===")
     print("Este script vai limpar todos os dados dos bancos de dados")
     print()
-    
+
     choice = input("Escolha uma opção:\n1. Limpar dados (manter estrutura)\n2. Remover arquivos completamente\n3. Cancelar\nOpção: ").strip()
-    
+
     if choice == "1":
         print("\n🧹 Limpando dados dos bancos...")
         clear_characters_db()
         clear_guilds_db()
         print("\n✅ Todos os dados foram limpos! Os bancos estão vazios e prontos para uso.")
-        
+
     elif choice == "2":
         confirm = input("\n⚠️  ATENÇÃO: Isso vai DELETAR completamente os arquivos de banco!\nTem certeza? (digite 'SIM' para confirmar): ").strip()
         if confirm == "SIM":
@@ -88,12 +210,63 @@ def main():
             print("💡 Os bancos serão recriados automaticamente quando os serviços iniciarem.")
         else:
             print("❌ Operação cancelada.")
-            
+
     elif choice == "3":
         print("❌ Operação cancelada.")
-        
+
     else:
         print("❌ Opção inválida!")
 
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description='Limpeza, snapshot e restauração dos bancos do Ashen Network')
+    parser.add_argument('--data-dir', default=DATA_DIR, help='diretório dos bancos (padrão: ./data)')
+    parser.add_argument('--db', choices=['all', *DATABASES], default='all', help='banco a tratar (padrão: all)')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    truncate = commands.add_parser('truncate', help='apaga os dados e compacta os arquivos')
+    truncate.add_argument('--no-vacuum', action='store_true', help='não rodar VACUUM depois da limpeza')
+
+    snapshot = commands.add_parser('snapshot', help='salva o estado atual com a API de backup')
+    snapshot.add_argument('--name', default='default')
+
+    restore = commands.add_parser('restore', help='restaura um snapshot salvo')
+    restore.add_argument('--name', default='default')
+
+    commands.add_parser('list', help='lista os snapshots salvos')
+
+    remove = commands.add_parser('remove', help='apaga os arquivos de banco')
+    remove.add_argument('--yes', action='store_true', help='não pedir confirmação')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv:
+        interactive()
+        return
+
+    args = parse_args(argv)
+    names = list(DATABASES) if args.db == 'all' else [args.db]
+
+    if args.command == 'truncate':
+        run_parallel(truncate_db, names, args.data_dir, not args.no_vacuum)
+    elif args.command == 'snapshot':
+        run_parallel(snapshot_db, names, args.name, args.data_dir)
+    elif args.command == 'restore':
+        run_parallel(restore_db, names, args.name, args.data_dir)
+    elif args.command == 'list':
+        list_snapshots(args.data_dir)
+    elif args.command == 'remove':
+        if not args.yes:
+            confirm = input("⚠️  Isso vai DELETAR os arquivos de banco! Digite 'SIM' para confirmar: ").strip()
+            if confirm != "SIM":
+                print("❌ Operação cancelada.")
+                return
+        started = time.perf_counter()
+        remove_databases(names, args.data_dir)
+        print(f"⏱️  Tempo total: {elapsed_ms(started):.1f} ms")
+
+
 if __name__ == "__main__":
     main()
@@ -35,6 +35,11 @@ db.serialize(() => {
       FOREIGN KEY(item_id) REFERENCES items(id)
     )
   `);
+
+  // Usado pelo get_guild_roster do serviço SOAP (junção por nome do personagem)
+  db.run(`
+    CREATE INDEX IF NOT EXISTS idx_characters_name ON characters (name)
+  `);
 });
 
 module.exports = db;
@@ -12,22 +12,48 @@ app.use(express.json());
 const REST_API_URL = 'http://localhost:3001';
 const SOAP_SERVICE_URL = 'http://localhost:8000/soap';
 
+// Escapa valores do usuário antes de colocá-los no envelope SOAP
+function escapeXml(value) {
+  return String(value)
+    .replace(/&/g, '&amp;')
+    .replace(/</g, '&lt;')
+    .replace(/>/g, '&gt;');
+}
+
+// Decodifica as entidades de um texto extraído da resposta SOAP
+function unescapeXml(value) {
+  if (value === undefined) {
+    return value;
+  }
+  return value.replace(/&(lt|gt|quot|apos|#\d+|#x[0-9a-fA-F]+|amp);/g, (entity, code) => {
+    switch (code) {
+      case 'lt': return '<';
+      case 'gt': return '>';
+      case 'quot': return '"';
+      case 'apos': return "'";
+      case 'amp': return '&';
+      default:
+        return String.fromCodePoint(code[1] === 'x' ? parseInt(code.slice(2), 16) : parseInt(code.slice(1), 10));
+    }
+  });
+}
+
 // Função auxiliar para parsing SOAP simplificado
 function parseSoapResponse(soapResponse, tagName) {
   const regex = new RegExp(`<${tagName}>(.*?)</${tagName}>`, 'g');
   const matches = [];
   let match;
   while ((match = regex.exec(soapResponse)) !== null) {
-    matches.push(match[1]);
+    matches.push(unescapeXml(match[1]));
   }
   return matches;
 }
 
 function parseGuildFromSoap(guildXml) {
   const id = guildXml.match(/<id>(\d+)<\/id>/)?.[1];
-  const name = guildXml.match(/<name>(.*?)<\/name>/)?.[1];
-  const description = guildXml.match(/<description>(.*?)<\/description>/)?.[1];
-  const leader = guildXml.match(/<leader>(.*?)<\/leader>/)?.[1];
+  const name = unescapeXml(guildXml.match(/<name>(.*?)<\/name>/)?.[1]);
+  const description = unescapeXml(guildXml.match(/<description>(.*?)<\/description>/)?.[1]);
+  const leader = unescapeXml(guildXml.match(/<leader>(.*?)<\/leader>/)?.[1]);
   const member_count = guildXml.match(/<member_count>(\d+)<\/member_count>/)?.[1];
   
   if (id && name) {
@@ -67,7 +93,7 @@ async function soapRequest(operation, body = '') {
     
     // Verificar se há SOAP Fault na resposta
     if (response.data.includes('<soap:Fault>')) {
-      const faultString = response.data.match(/<faultstring>(.*?)<\/faultstring>/)?.[1] || 'SOAP Fault occurred';
+      const faultString = unescapeXml(response.data.match(/<faultstring>(.*?)<\/faultstring>/)?.[1]) || 'SOAP Fault occurred';
       throw new Error(faultString);
     }
     
@@ -75,7 +101,7 @@ async function soapRequest(operation, body = '') {
   } catch (error) {
     // Se error.response existe, verificar SOAP Fault
     if (error.response && error.response.data && error.response.data.includes('<soap:Fault>')) {
-      const faultString = error.response.data.match(/<faultstring>(.*?)<\/faultstring>/)?.[1] || 'SOAP Fault occurred';
+      const faultString = unescapeXml(error.response.data.match(/<faultstring>(.*?)<\/faultstring>/)?.[1]) || 'SOAP Fault occurred';
       throw new Error(faultString);
     }
     throw new Error(`SOAP Error: ${error.message}`);
@@ -265,14 +291,14 @@ app.get('/api/gateway/guilds', checkSoapConnection, async (req, res) => {
 // Buscar guilda por ID (SOAP)
 app.get('/api/gateway/guilds/:id', checkSoapConnection, async (req, res) => {
   try {
-    const soapBody = `<guild_id>${req.params.id}</guild_id>`;
+    const soapBody = `<guild_id>${escapeXml(req.params.id)}</guild_id>`;
     const soapResponse = await soapRequest('get_guild_by_id', soapBody);
     
     // Parse da resposta
     const id = soapResponse.match(/<id>(\d+)<\/id>/)?.[1];
-    const name = soapResponse.match(/<name>(.*?)<\/name>/)?.[1];
-    const description = soapResponse.match(/<description>(.*?)<\/description>/)?.[1];
-    const leader = soapResponse.match(/<leader>(.*?)<\/leader>/)?.[1];
+    const name = unescapeXml(soapResponse.match(/<name>(.*?)<\/name>/)?.[1]);
+    const description = unescapeXml(soapResponse.match(/<description>(.*?)<\/description>/)?.[1]);
+    const leader = unescapeXml(soapResponse.match(/<leader>(.*?)<\/leader>/)?.[1]);
     const member_count = soapResponse.match(/<member_count>(\d+)<\/member_count>/)?.[1];
 
     if (!id) {
@@ -324,16 +350,16 @@ app.post('/api/gateway/guilds', checkSoapConnection, async (req, res) => {
     }
 
     const soapBody = `
-      <name>${name}</name>
-      <description>${description}</description>
-      <leader>${leader}</leader>
+      <name>${escapeXml(name)}</name>
+      <description>${escapeXml(description)}</description>
+      <leader>${escapeXml(leader)}</leader>
     `;
     
     const soapResponse = await soapRequest('create_guild', soapBody);
     
     // Parse da resposta para extrair a guilda criada
     const id = soapResponse.match(/<id>(\d+)<\/id>/)?.[1];
-    const guildName = soapResponse.match(/<name>(.*?)<\/name>/)?.[1];
+    const guildName = unescapeXml(soapResponse.match(/<name>(.*?)<\/name>/)?.[1]);
     
     if (!id) {
       return res.status(400).json({
@@ -378,8 +404,8 @@ app.post('/api/gateway/guilds/join', checkSoapConnection, async (req, res) => {
     }
 
     const soapBody = `
-      <guild_id>${guild_id}</guild_id>
-      <character_name>${character_name}</character_name>
+      <guild_id>${escapeXml(guild_id)}</guild_id>
+      <character_name>${escapeXml(character_name)}</character_name>
     `;
     
     try {
@@ -425,7 +451,7 @@ app.post('/api/gateway/guilds/join', checkSoapConnection, async (req, res) => {
 // Membros da guilda (SOAP)
 app.get('/api/gateway/guilds/:id/members', checkSoapConnection, async (req, res) => {
   try {
-    const soapBody = `<guild_id>${req.params.id}</guild_id>`;
+    const soapBody = `<guild_id>${escapeXml(req.params.id)}</guild_id>`;
     const soapResponse = await soapRequest('get_guild_members', soapBody);
     
     // Parse da resposta para extrair membros
@@ -435,9 +461,9 @@ app.get('/api/gateway/guilds/:id/members', checkSoapConnection, async (req, res)
     if (memberMatches) {
       memberMatches.forEach(memberXml => {
         const id = memberXml.match(/<id>(\d+)<\/id>/)?.[1];
-        const character_name = memberXml.match(/<character_name>(.*?)<\/character_name>/)?.[1];
-        const rank = memberXml.match(/<rank>(.*?)<\/rank>/)?.[1];
-        const join_date = memberXml.match(/<join_date>(.*?)<\/join_date>/)?.[1];
+        const character_name = unescapeXml(memberXml.match(/<character_name>(.*?)<\/character_name>/)?.[1]);
+        const rank = unescapeXml(memberXml.match(/<rank>(.*?)<\/rank>/)?.[1]);
+        const join_date = unescapeXml(memberXml.match(/<join_date>(.*?)<\/join_date>/)?.[1]);
         
         if (id && character_name) {
           members.push({
@@ -498,7 +524,7 @@ app.get('/api/gateway/dashboard', async (req, res) => {
     if (guildMatches) {
       guildMatches.forEach(guildXml => {
         const id = guildXml.match(/<id>(\d+)<\/id>/)?.[1];
-        const name = guildXml.match(/<name>(.*?)<\/name>/)?.[1];
+        const name = unescapeXml(guildXml.match(/<name>(.*?)<\/name>/)?.[1]);
         if (id && name) {
           guilds.push({ id: parseInt(id), name });
         }
@@ -0,0 +1,123 @@
+"""
+Controle de admissão do serviço de guildas.
+
+Cada classe de operação (leitura, escrita) tem um limite de operações em
+andamento e uma fila de espera limitada. Quem não consegue vaga dentro do
+prazo (o da fila ou o do cliente, o que vencer antes) é recusado na hora,
+em vez de ficar acumulando trabalho que o cliente já vai ter abandonado.
+"""
+
+import threading
+import time
+
+
+class Overloaded(Exception):
+    """Requisição recusada; 'reason' é queue_full, timeout ou deadline"""
+
+    def __init__(self, message, reason):
+        super().__init__(message)
+        self.reason = reason
+
+
+class Ticket:
+    """Vaga concedida; release() pode ser chamado mais de uma vez"""
+
+    __slots__ = ('_limiter', '_released')
+
+    def __init__(self, limiter):
+        self._limiter = limiter
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self._limiter._release()
+
+
+class _NoLimit:
+    def release(self):
+        pass
+
+
+NO_LIMIT = _NoLimit()
+
+
+class AdmissionLimiter:
+    """Limite de concorrência com fila de espera limitada e prazo"""
+
+    def __init__(self, name, max_concurrent, max_queue=64, max_wait=0.25):
+        # max_concurrent <= 0 desliga o limite
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+
+        self._condition = threading.Condition()
+        self._active = 0
+        self._waiting = 0
+        self._admitted = 0
+        self._rejected = {'queue_full': 0, 'timeout': 0, 'deadline': 0}
+        self._wait_time = 0.0
+
+    def acquire(self, deadline=None):
+        """
+        Reserva uma vaga e devolve o Ticket a liberar no fim da operação.
+        'deadline' (time.monotonic) é o prazo do cliente, se houver.
+        """
+        if self.max_concurrent <= 0:
+            return NO_LIMIT
+
+        now = time.monotonic()
+        limit = now + self.max_wait
+        reason = 'timeout'
+        if deadline is not None and deadline < limit:
+            limit, reason = deadline, 'deadline'
+
+        with self._condition:
+            if deadline is not None and deadline <= now:
+                # O prazo do cliente já venceu: qualquer trabalho seria desperdiçado
+                self._rejected['deadline'] += 1
+                raise Overloaded('Deadline exceeded', 'deadline')
+
+            if self._active < self.max_concurrent and not self._waiting:
+                self._active += 1
+                self._admitted += 1
+                return Ticket(self)
+
+            if self._waiting >= self.max_queue:
+                self._rejected['queue_full'] += 1
+                raise Overloaded('Service overloaded', 'queue_full')
+
+            self._waiting += 1
+            try:
+                while self._active >= self.max_concurrent:
+                    remaining = limit - time.monotonic()
+                    if remaining <= 0:
+                        self._rejected[reason] += 1
+                        raise Overloaded('Deadline exceeded' if reason == 'deadline' else 'Service overloaded',
+                                         reason)
+                    self._condition.wait(remaining)
+                self._active += 1
+                self._admitted += 1
+            finally:
+                self._waiting -= 1
+                self._wait_time += time.monotonic() - now
+            return Ticket(self)
+
+    def _release(self):
+        with self._condition:
+            self._active -= 1
+            self._condition.notify()
+
+    def stats(self):
+        with self._condition:
+            return {
+                'max_concurrent': self.max_concurrent,
+                'max_queue': self.max_queue,
+                'max_wait_seconds': self.max_wait,
+                'active': self._active,
+                'waiting': self._waiting,
+                'admitted': self._admitted,
+                'rejected': dict(self._rejected),
+                'wait_time_seconds': round(self._wait_time, 6),
+            }
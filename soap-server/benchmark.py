@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+"""
+Benchmark do serviço SOAP de guildas.
+
+Popula um guilds.db descartável com o volume pedido e dispara cada operação
+pelo test client do Flask e/ou por HTTP real, com concorrência configurável.
+O resultado (vazão e latências p50/p95/p99 por operação) sai em JSON para
+comparação entre commits.
+
+Uso:
+    python benchmark.py --guilds 1000 --members-per-guild 50 --requests 500 --concurrency 8
+    python benchmark.py --mode http --url http://localhost:8000/soap --output bench.json
+"""
+
+import argparse
+import http.client
+import itertools
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+OPERATIONS = ['get_all_guilds', 'get_guild_by_id', 'create_guild', 'join_guild', 'get_guild_members']
+
+ENVELOPE = ('<?xml version="1.0" encoding="UTF-8"?>'
+            '<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/" '
+            'xmlns:tns="http://ashennetwork.soap/guild">'
+            '<soap:Body><tns:{op}>{body}</tns:{op}></soap:Body></soap:Envelope>')
+
+
+def log(message):
+    # stdout fica só com o relatório JSON (para poder ser redirecionado/encadeado)
+    print(message, file=sys.stderr)
+
+
+def seed_database(db_path, guilds, members_per_guild):
+    """Cria o schema via init_database() e insere o volume pedido"""
+    import soap_server_simple as server
+
+    server.init_database(log=log)
+    conn = sqlite3.connect(db_path)
+    with conn:
+        conn.execute('DELETE FROM guild_members')
+        conn.execute('DELETE FROM guilds')
+        conn.executemany(
+            'INSERT INTO guilds (id, name, description, leader, member_count) VALUES (?, ?, ?, ?, 0)',
+            ((i, f'Guild {i}', f'Benchmark guild number {i}', f'Leader {i}') for i in range(1, guilds + 1)))
+        conn.executemany(
+            'INSERT INTO guild_members (character_name, guild_id, rank, join_date) VALUES (?, ?, ?, ?)',
+            ((f'Member {g}-{m}', g, 'Leader' if m == 0 else 'Member', '2024-01-01')
+             for g in range(1, guilds + 1) for m in range(members_per_guild)))
+    conn.close()
+
+
+class RequestFactory:
+    """Gera corpos SOAP para cada operação (nomes únicos para as escritas)"""
+
+    def __init__(self, guilds, page_size):
+        self.guilds = max(guilds, 1)
+        self.page_size = page_size
+        self._run = f'{os.getpid()}-{int(time.time())}'
+
+    # Compartilhado entre as fábricas de cada driver: os nomes não se repetem no mesmo banco
+    _counter = itertools.count()
+
+    def body(self, op):
+        n = next(self._counter)
+        guild_id = random.randint(1, self.guilds)
+        if op == 'get_all_guilds':
+            return f'<page_size>{self.page_size}</page_size>' if self.page_size else ''
+        if op in ('get_guild_by_id', 'get_guild_members'):
+            return f'<guild_id>{guild_id}</guild_id>'
+        if op == 'create_guild':
+            return (f'<name>Bench {self._run}-{n}</name><description>benchmark</description>'
+                    f'<leader>Bench Leader {n}</leader>')
+        if op == 'join_guild':
+            return f'<guild_id>{guild_id}</guild_id><character_name>Bench {self._run}-{n}</character_name>'
+        raise ValueError(f'Unknown operation: {op}')
+
+    def envelope(self, op):
+        return ENVELOPE.format(op=op, body=self.body(op)).encode('utf-8')
+
+
+class TestClientDriver:
+    """Envia as requisições pelo test client do Flask (sem rede)"""
+
+    name = 'test_client'
+
+    def __init__(self, app):
+        self.app = app
+        self._local = threading.local()
+
+    def post(self, op, payload):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        response = client.post('/soap', data=payload, headers={
+            'Content-Type': 'text/xml; charset=utf-8',
+            'SOAPAction': f'http://ashennetwork.soap/guild/{op}',
+        })
+        response.get_data()
+        return response.status_code
+
+
+class HttpDriver:
+    """Envia as requisições por HTTP real, uma conexão keep-alive por thread"""
+
+    name = 'http'
+
+    def __init__(self, url):
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.path = parts.path or '/soap'
+        self._local = threading.local()
+
+    def post(self, op, payload):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = http.client.HTTPConnection(self.host, self.port, timeout=30)
+        try:
+            conn.request('POST', self.path, body=payload, headers={
+                'Content-Type': 'text/xml; charset=utf-8',
+                'SOAPAction': f'http://ashennetwork.soap/guild/{op}',
+            })
+            response = conn.getresponse()
+            response.read()
+            return response.status
+        except (http.client.HTTPException, OSError):
+            conn.close()
+            self._local.conn = None
+            raise
+
+
+def start_local_server(app):
+    """Sobe o app em uma porta livre e retorna (url, server)"""
+    from werkzeug.serving import make_server
+
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f'http://127.0.0.1:{server.server_port}/soap', server
+
+
+def percentile(sorted_values, pct):
+    """Percentil por rank mais próximo de uma lista já ordenada"""
+    if not sorted_values:
+        return 0.0
+    rank = max(int(round(pct / 100.0 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def run_operation(driver, factory, op, requests, concurrency, warmup):
+    """Executa 'requests' chamadas de 'op' e resume as latências"""
+    for _ in range(warmup):
+        driver.post(op, factory.envelope(op))
+
+    latencies = []
+    errors = 0
+    # Contagem por status HTTP (ou 'exception'): separa 503 de admissão de falhas reais
+    statuses = {}
+    lock = threading.Lock()
+
+    def one(_):
+        nonlocal errors
+        payload = factory.envelope(op)
+        started = time.perf_counter()
+        try:
+            status = driver.post(op, payload)
+        except Exception:
+            status = 'exception'
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+            if status not in (200, 304):
+                errors += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(requests)))
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    ms = lambda seconds: round(seconds * 1000.0, 3)
+    return {
+        'requests': requests,
+        'errors': errors,
+        'status_counts': dict(sorted(statuses.items())),
+        'wall_seconds': round(wall, 4),
+        'throughput_rps': round(requests / wall, 2) if wall else 0.0,
+        'mean_ms': ms(sum(latencies) / len(latencies)) if latencies else 0.0,
+        'p50_ms': ms(percentile(latencies, 50)),
+        'p95_ms': ms(percentile(latencies, 95)),
+        'p99_ms': ms(percentile(latencies, 99)),
+        'max_ms': ms(latencies[-1]) if latencies else 0.0,
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark do serviço SOAP de guildas')
+    parser.add_argument('--mode', choices=['client', 'http', 'both'], default='both',
+                        help='test client do Flask, HTTP real ou ambos (padrão: both)')
+    parser.add_argument('--url', help='endpoint SOAP externo; sem ele o app é servido localmente')
+    parser.add_argument('--db', help='guilds.db a usar (padrão: arquivo temporário descartável)')
+    parser.add_argument('--no-seed', action='store_true', help='não repopular o banco')
+    parser.add_argument('--guilds', type=int, default=1000)
+    parser.add_argument('--members-per-guild', type=int, default=20)
+    parser.add_argument('--requests', type=int, default=500, help='requisições por operação')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--warmup', type=int, default=10, help='requisições de aquecimento por operação')
+    parser.add_argument('--page-size', type=int, default=0,
+                        help='page_size de get_all_guilds (0 = tabela inteira)')
+    parser.add_argument('--operations', default=','.join(OPERATIONS),
+                        help='lista separada por vírgulas (padrão: todas)')
+    parser.add_argument('--no-cache', action='store_true', help='desliga o cache de respostas')
+    parser.add_argument('--seed', type=int, default=42, help='semente do gerador aleatório')
+    parser.add_argument('--output', help='arquivo JSON de saída (padrão: stdout)')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    random.seed(args.seed)
+    operations = [op.strip() for op in args.operations.split(',') if op.strip()]
+    unknown = set(operations) - set(OPERATIONS)
+    if unknown:
+        sys.exit(f'Operações desconhecidas: {", ".join(sorted(unknown))}')
+
+    tmpdir = None
+    db_path = args.db
+    if db_path is None and not (args.url and args.mode == 'http'):
+        tmpdir = tempfile.mkdtemp(prefix='guild-bench-')
+        db_path = os.path.join(tmpdir, 'guilds.db')
+
+    # O servidor lê a configuração do ambiente na importação
+    if db_path:
+        os.environ['GUILDS_DB_PATH'] = os.path.abspath(db_path)
+    if args.no_cache:
+        os.environ['GUILDS_CACHE_SIZE'] = '0'
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+    report = {
+        'meta': {
+            'revision': git_revision(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'guilds': args.guilds,
+            'members_per_guild': args.members_per_guild,
+            'requests_per_operation': args.requests,
+            'concurrency': args.concurrency,
+            'page_size': args.page_size,
+            'cache': not args.no_cache,
+        },
+        'results': {},
+    }
+
+    local_server = None
+    try:
+        app = None
+        if db_path:
+            import soap_server_simple as server
+            if not args.no_seed:
+                started = time.perf_counter()
+                seed_database(db_path, args.guilds, args.members_per_guild)
+                report['meta']['seed_seconds'] = round(time.perf_counter() - started, 3)
+            else:
+                server.init_database(log=log)
+            app = server.app
+
+        drivers = []
+        if args.mode in ('client', 'both'):
+            drivers.append(TestClientDriver(app))
+        if args.mode in ('http', 'both'):
+            url = args.url
+            if url is None:
+                url, local_server = start_local_server(app)
+            report['meta']['url'] = url
+            drivers.append(HttpDriver(url))
+
+        for driver in drivers:
+            factory = RequestFactory(args.guilds, args.page_size)
+            results = report['results'][driver.name] = {}
+            for op in operations:
+                print(f'[{driver.name}] {op}...', file=sys.stderr)
+                results[op] = run_operation(driver, factory, op, args.requests, args.concurrency, args.warmup)
+    finally:
+        if local_server is not None:
+            local_server.shutdown()
+        if tmpdir:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
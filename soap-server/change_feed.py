@@ -0,0 +1,82 @@
+"""
+Feed de alterações do serviço de guildas.
+
+As alterações ficam na tabela guild_changes (preenchida por triggers). Este
+módulo só avisa os assinantes do stream SSE de que há versões novas: escritas
+do próprio processo acordam os assinantes na hora; escritas de outros
+processos são percebidas pela consulta periódica de cada assinante.
+"""
+
+import json
+import threading
+
+
+class ChangeNotifier:
+    """Sinal de 'houve escrita' compartilhado entre threads"""
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._sequence = 0
+
+    @property
+    def sequence(self):
+        return self._sequence
+
+    def notify(self):
+        with self._condition:
+            self._sequence += 1
+            self._condition.notify_all()
+
+    def wait(self, seen, timeout):
+        """Espera até a sequência passar de 'seen' ou o timeout; retorna a sequência atual"""
+        with self._condition:
+            if self._sequence == seen:
+                self._condition.wait(timeout)
+            return self._sequence
+
+
+class SubscriberLimit:
+    """Limite de streams abertos ao mesmo tempo (cada um ocupa uma thread)"""
+
+    def __init__(self, max_subscribers):
+        self.max_subscribers = max_subscribers
+        self._slots = threading.BoundedSemaphore(max_subscribers)
+        self._lock = threading.Lock()
+        self._active = 0
+
+    def acquire(self):
+        if not self._slots.acquire(blocking=False):
+            return False
+        with self._lock:
+            self._active += 1
+        return True
+
+    def release(self):
+        with self._lock:
+            self._active -= 1
+        self._slots.release()
+
+    @property
+    def active(self):
+        return self._active
+
+
+def change_dict(row):
+    version, change_type, guild_id, character_name, changed_at = row
+    return {
+        'version': version,
+        'type': change_type,
+        'guild_id': guild_id,
+        'character_name': character_name,
+        'changed_at': changed_at,
+    }
+
+
+def sse_event(row):
+    """Linha de guild_changes -> evento SSE (id = versão, para o Last-Event-ID)"""
+    data = json.dumps(change_dict(row), ensure_ascii=False, separators=(',', ':'))
+    return f'id: {row[0]}\nevent: change\ndata: {data}\n\n'.encode('utf-8')
+
+
+def sse_comment(text):
+    return f': {text}\n\n'.encode('utf-8')
@@ -0,0 +1,242 @@
+"""
+Pool de conexões SQLite para o serviço SOAP de guildas.
+
+As conexões são abertas uma única vez e reaproveitadas entre requisições.
+O banco é colocado em modo WAL para que leituras não fiquem bloqueadas
+atrás de escritas (join_guild/create_guild). Operações de leitura recebem
+conexões com PRAGMA query_only: um handler de leitura que tente escrever
+falha em vez de abrir uma transação de escrita.
+"""
+
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+# Pragmas aplicados a cada conexão recém-aberta
+DEFAULT_PRAGMAS = (
+    ('journal_mode', 'WAL'),
+    ('synchronous', 'NORMAL'),     # seguro em WAL: fsync apenas no checkpoint
+    ('cache_size', -16000),        # ~16 MB de page cache por conexão
+    ('mmap_size', 268435456),      # 256 MB mapeados em memória
+    ('temp_store', 'MEMORY'),
+    ('foreign_keys', 'ON'),
+)
+
+
+class PoolTimeout(Exception):
+    """Nenhuma conexão ficou livre dentro do tempo limite"""
+
+
+class TimedCursor(sqlite3.Cursor):
+    """Cursor que informa ao observador o tempo de cada comando SQL"""
+
+    _last_sql = None
+
+    def _timed(self, method, sql, *args):
+        observer = self.connection.statement_observer
+        if observer is None:
+            return method(self, sql, *args)
+        self._last_sql = sql
+        started = time.perf_counter()
+        try:
+            return method(self, sql, *args)
+        finally:
+            observer(sql, time.perf_counter() - started)
+
+    def execute(self, sql, parameters=()):
+        return self._timed(sqlite3.Cursor.execute, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self._timed(sqlite3.Cursor.executemany, sql, seq_of_parameters)
+
+    def _timed_fetch(self, method, *args):
+        # O SQLite avança as linhas sob demanda: a busca também é tempo de SQL
+        observer = self.connection.statement_observer
+        if observer is None or self._last_sql is None:
+            return method(self, *args)
+        started = time.perf_counter()
+        try:
+            return method(self, *args)
+        finally:
+            observer(self._last_sql, time.perf_counter() - started, fetch=True)
+
+    def fetchone(self):
+        return self._timed_fetch(sqlite3.Cursor.fetchone)
+
+    def fetchmany(self, size=None):
+        if size is None:
+            return self._timed_fetch(sqlite3.Cursor.fetchmany)
+        return self._timed_fetch(sqlite3.Cursor.fetchmany, size)
+
+    def fetchall(self):
+        return self._timed_fetch(sqlite3.Cursor.fetchall)
+
+
+class TimedConnection(sqlite3.Connection):
+    """Conexão cujos cursores são TimedCursor"""
+
+    statement_observer = None
+    # Estado atual do PRAGMA query_only (mantido pelo pool)
+    query_only = False
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def commit(self):
+        observer = self.statement_observer
+        if observer is None or not self.in_transaction:
+            return super().commit()
+        started = time.perf_counter()
+        try:
+            return super().commit()
+        finally:
+            observer('COMMIT', time.perf_counter() - started)
+
+
+class ConnectionPool:
+    """Pool limitado de conexões compartilhadas entre threads"""
+
+    def __init__(self, db_path, max_size=8, timeout=5.0, busy_timeout_ms=5000,
+                 cached_statements=256, pragmas=DEFAULT_PRAGMAS, statement_observer=None, uri=False):
+        self.db_path = db_path
+        self.max_size = max_size
+        self.timeout = timeout
+        self.busy_timeout_ms = busy_timeout_ms
+        self.cached_statements = cached_statements
+        self.pragmas = pragmas
+        # uri=True permite 'file:...?mode=ro' no caminho e nos ATTACH das conexões
+        self.uri = uri
+        # Chamado como observer(sql, segundos, fetch=False) após cada comando;
+        # fetch=True indica tempo gasto buscando linhas de um comando já contado
+        self.statement_observer = statement_observer
+
+        # LIFO: a conexão usada mais recentemente tem o cache mais quente.
+        # Uma pilha por modo (True = somente leitura), para não alternar o
+        # PRAGMA query_only a cada empréstimo
+        self._idle = {False: queue.LifoQueue(), True: queue.LifoQueue()}
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._lock = threading.Lock()
+        self._closed = False
+
+        self._opened = 0
+        self._checkouts = 0
+        self._in_use = 0
+        self._waits = 0
+        self._wait_time = 0.0
+        self._timeouts = 0
+        self._read_checkouts = 0
+        self._mode_switches = 0
+
+    def _open(self):
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.busy_timeout_ms / 1000.0,
+            check_same_thread=False,
+            cached_statements=self.cached_statements,
+            factory=TimedConnection,
+            uri=self.uri,
+        )
+        conn.statement_observer = self.statement_observer
+        for name, value in self.pragmas:
+            conn.execute(f'PRAGMA {name} = {value}')
+        with self._lock:
+            self._opened += 1
+        return conn
+
+    def _acquire(self):
+        if self._slots.acquire(blocking=False):
+            return
+        started = time.perf_counter()
+        acquired = self._slots.acquire(timeout=self.timeout)
+        with self._lock:
+            self._waits += 1
+            self._wait_time += time.perf_counter() - started
+            if not acquired:
+                self._timeouts += 1
+        if not acquired:
+            raise PoolTimeout(f'No database connection available after {self.timeout}s')
+
+    def _take(self, readonly):
+        """Conexão ociosa do modo pedido; senão a do outro modo (trocando o modo) ou uma nova"""
+        try:
+            return self._idle[readonly].get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            conn = self._idle[not readonly].get_nowait()
+        except queue.Empty:
+            conn = self._open()
+        if conn.query_only != readonly:
+            conn.execute(f'PRAGMA query_only = {"ON" if readonly else "OFF"}')
+            conn.query_only = readonly
+            with self._lock:
+                self._mode_switches += 1
+        return conn
+
+    @contextmanager
+    def connection(self, readonly=False):
+        """
+        Empresta uma conexão do pool e a devolve ao final do bloco.
+        readonly=True entrega uma conexão com PRAGMA query_only ligado.
+        """
+        if self._closed:
+            raise RuntimeError('Connection pool is closed')
+
+        self._acquire()
+        conn = None
+        try:
+            conn = self._take(readonly)
+            with self._lock:
+                self._checkouts += 1
+                self._in_use += 1
+                if readonly:
+                    self._read_checkouts += 1
+            yield conn
+        finally:
+            if conn is not None:
+                # Transação esquecida aberta não pode vazar para o próximo uso
+                if conn.in_transaction:
+                    conn.rollback()
+                with self._lock:
+                    self._in_use -= 1
+                if self._closed:
+                    conn.close()
+                else:
+                    self._idle[conn.query_only].put(conn)
+            self._slots.release()
+
+    def stats(self):
+        """Retorna estatísticas de uso do pool"""
+        with self._lock:
+            return {
+                'db_path': self.db_path,
+                'max_size': self.max_size,
+                'opened': self._opened,
+                'idle': self._idle[False].qsize() + self._idle[True].qsize(),
+                'idle_readonly': self._idle[True].qsize(),
+                'in_use': self._in_use,
+                'checkouts': self._checkouts,
+                'read_checkouts': self._read_checkouts,
+                'mode_switches': self._mode_switches,
+                'waits': self._waits,
+                'wait_time_seconds': round(self._wait_time, 6),
+                'timeouts': self._timeouts,
+            }
+
+    def close(self):
+        """Fecha todas as conexões ociosas e impede novos empréstimos"""
+        self._closed = True
+        for idle in self._idle.values():
+            while True:
+                try:
+                    idle.get_nowait().close()
+                except queue.Empty:
+                    break
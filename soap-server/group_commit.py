@@ -0,0 +1,148 @@
+"""
+Group commit das escritas do serviço de guildas.
+
+Uma única thread escritora recebe as operações por uma fila limitada e as
+agrupa em uma transação a cada poucos milissegundos (ou a cada N operações).
+Cada operação roda em um SAVEPOINT próprio, então a falha de uma não desfaz
+as outras. Quem enviou a operação só recebe o resultado depois do COMMIT do
+lote: a durabilidade é a mesma do commit por requisição, mas o custo do
+commit (e a disputa pelo lock de escrita) é dividido pelo lote inteiro.
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class WriterBusy(Exception):
+    """A fila do escritor está cheia"""
+
+
+class _Operation:
+    __slots__ = ('function', 'params', 'future')
+
+    def __init__(self, function, params):
+        self.function = function
+        self.params = params
+        self.future = Future()
+
+
+_STOP = object()
+
+
+class GroupCommitWriter:
+    """Thread escritora que confirma as operações em lotes"""
+
+    def __init__(self, connection_factory, max_batch=64, max_delay=0.005, queue_size=1024,
+                 submit_timeout=1.0, name='guild-group-commit'):
+        # connection_factory() deve devolver um context manager com a conexão
+        self.connection_factory = connection_factory
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.submit_timeout = submit_timeout
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._batches = 0
+        self._operations = 0
+        self._rejected = 0
+        self._largest_batch = 0
+        self._commit_time = 0.0
+
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, function, params, timeout=None):
+        """
+        Enfileira function(cursor, params) e espera o commit do lote.
+        Retorna o resultado da função ou relança a exceção dela (ou a do COMMIT).
+        """
+        operation = _Operation(function, params)
+        try:
+            self._queue.put(operation, timeout=self.submit_timeout)
+        except queue.Full:
+            with self._lock:
+                self._rejected += 1
+            raise WriterBusy('Write queue is full') from None
+        return operation.future.result(timeout)
+
+    def _collect(self, first):
+        """Junta ao primeiro item o que chegar até max_delay ou max_batch"""
+        batch = [first]
+        deadline = time.perf_counter() + self.max_delay
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                # Repõe o sinal de parada para depois deste lote
+                self._queue.put(item)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                return
+            batch = self._collect(first)
+            try:
+                self._commit(batch)
+            except Exception as e:
+                # Falha do BEGIN/COMMIT: nenhuma operação do lote foi confirmada
+                for operation in batch:
+                    if not operation.future.done():
+                        operation.future.set_exception(e)
+
+    def _commit(self, batch):
+        started = time.perf_counter()
+        results = []
+        with self.connection_factory() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            cursor = conn.cursor()
+            for operation in batch:
+                cursor.execute('SAVEPOINT group_item')
+                try:
+                    result = operation.function(cursor, operation.params)
+                except Exception as e:
+                    cursor.execute('ROLLBACK TO group_item')
+                    cursor.execute('RELEASE group_item')
+                    results.append((operation, None, e))
+                    continue
+                cursor.execute('RELEASE group_item')
+                results.append((operation, result, None))
+            conn.commit()
+
+        # Só agora, com o lote durável, as respostas são liberadas
+        for operation, result, error in results:
+            if error is None:
+                operation.future.set_result(result)
+            else:
+                operation.future.set_exception(error)
+
+        with self._lock:
+            self._batches += 1
+            self._operations += len(batch)
+            self._largest_batch = max(self._largest_batch, len(batch))
+            self._commit_time += time.perf_counter() - started
+
+    def stats(self):
+        with self._lock:
+            return {
+                'batches': self._batches,
+                'operations': self._operations,
+                'rejected': self._rejected,
+                'queued': self._queue.qsize(),
+                'largest_batch': self._largest_batch,
+                'average_batch': round(self._operations / self._batches, 2) if self._batches else 0.0,
+                'batch_time_seconds': round(self._commit_time, 6),
+            }
+
+    def close(self, timeout=5.0):
+        """Confirma o que já está na fila e encerra a thread"""
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
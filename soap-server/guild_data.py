@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+"""
+Importação e exportação em massa de guildas e membros (NDJSON ou CSV).
+
+Os dados são lidos e escritos em streaming, com memória constante. A
+importação usa executemany em transações grandes, pragmas de carga em massa
+e adia os índices e triggers da tabela (índice único de membros, member_count,
+índice de busca) até o fim da carga, quando são recriados e recalculados de
+uma vez.
+
+Uso:
+    python guild_data.py export --table guilds --format ndjson --output guilds.ndjson
+    python guild_data.py export --table members --format csv > members.csv
+    python guild_data.py import --table guilds --input guilds.ndjson
+    python guild_data.py import --table members --format csv --input members.csv --batch-size 50000
+
+Rode a importação com o serviço SOAP parado: durante a carga o índice de
+membros não existe e o cache do serviço não é invalidado.
+"""
+
+import argparse
+import csv
+import json
+import os
+import sqlite3
+import sys
+import time
+
+from migrations import migrate
+
+DEFAULT_DB_PATH = os.environ.get(
+    'GUILDS_DB_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'guilds.db'),
+)
+
+# Tabela lógica -> (tabela SQL, colunas, colunas inteiras, colunas obrigatórias)
+TABLES = {
+    'guilds': ('guilds', ['id', 'name', 'description', 'leader', 'member_count'],
+               {'id', 'member_count'}, {'name', 'leader'}),
+    'members': ('guild_members', ['id', 'character_name', 'guild_id', 'rank', 'join_date'],
+                {'id', 'guild_id'}, {'character_name', 'guild_id'}),
+}
+
+BULK_LOAD_PRAGMAS = (
+    ('synchronous', 'OFF'),
+    ('cache_size', -262144),       # ~256 MB de page cache durante a carga
+    ('temp_store', 'MEMORY'),
+    ('foreign_keys', 'OFF'),
+)
+
+# Valores para colunas ausentes no arquivo: um NULL explícito passaria por cima
+# do DEFAULT da tabela (member_count é recalculado no fim da carga de guildas)
+COLUMN_DEFAULTS = {
+    'guilds': {'member_count': 0},
+    'members': {'rank': 'Member'},
+}
+
+CONFLICT_CLAUSES = {'abort': 'INSERT', 'ignore': 'INSERT OR IGNORE', 'replace': 'INSERT OR REPLACE'}
+
+
+class Progress:
+    """Relatório periódico de linhas processadas e vazão (stderr)"""
+
+    def __init__(self, label, every=100000, out=sys.stderr):
+        self.label = label
+        self.every = every
+        self.out = out
+        self.count = 0
+        self.started = time.perf_counter()
+        self._next = every
+
+    def add(self, n):
+        self.count += n
+        if self.every and self.count >= self._next:
+            self._next += self.every
+            self.report()
+
+    def report(self, final=False):
+        elapsed = time.perf_counter() - self.started
+        rate = self.count / elapsed if elapsed else 0.0
+        prefix = 'Concluído' if final else 'Progresso'
+        print(f'{prefix} {self.label}: {self.count} linhas em {elapsed:.1f}s ({rate:,.0f} linhas/s)',
+              file=self.out)
+
+
+# ============ EXPORTAÇÃO ============
+
+def iter_rows(conn, table, batch_size):
+    sql_table, columns, _, _ = TABLES[table]
+    cursor = conn.execute(f'SELECT {", ".join(columns)} FROM {sql_table} ORDER BY id')
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            return
+        yield rows
+
+
+def export_table(conn, table, fmt, out, batch_size, progress):
+    columns = TABLES[table][1]
+    if fmt == 'csv':
+        writer = csv.writer(out)
+        writer.writerow(columns)
+        for rows in iter_rows(conn, table, batch_size):
+            writer.writerows(rows)
+            progress.add(len(rows))
+    else:
+        dumps = json.JSONEncoder(ensure_ascii=False, separators=(',', ':')).encode
+        for rows in iter_rows(conn, table, batch_size):
+            out.write(''.join(dumps(dict(zip(columns, row))) + '\n' for row in rows))
+            progress.add(len(rows))
+
+
+# ============ IMPORTAÇÃO ============
+
+def read_records(fmt, stream):
+    """Registros (dict) de um arquivo NDJSON ou CSV, um por vez"""
+    if fmt == 'csv':
+        yield from csv.DictReader(stream)
+        return
+    for number, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f'Linha {number}: JSON inválido ({e})') from None
+
+
+def coerce(table, record):
+    """Converte um registro para a tupla de colunas da tabela"""
+    _, columns, int_columns, required = TABLES[table]
+    defaults = COLUMN_DEFAULTS[table]
+    values = []
+    for column in columns:
+        value = record.get(column)
+        if value == '' or value is None:
+            value = defaults.get(column)
+        if value is not None and column in int_columns:
+            value = int(value)
+        if value is None and column in required:
+            raise ValueError(f'Campo obrigatório ausente: {column}')
+        values.append(value)
+    return tuple(values)
+
+
+def insert_sql(table, on_conflict):
+    sql_table, columns, _, _ = TABLES[table]
+    placeholders = ', '.join('?' * len(columns))
+    # id ausente (None) deixa o SQLite atribuir o próximo valor
+    return f'{CONFLICT_CLAUSES[on_conflict]} INTO {sql_table} ({", ".join(columns)}) VALUES ({placeholders})'
+
+
+def deferred_objects(conn, sql_table):
+    """Índices (não automáticos) e triggers de uma tabela, com o DDL para recriá-los"""
+    return conn.execute(
+        "SELECT type, name, sql FROM sqlite_master "
+        "WHERE tbl_name = ? AND type IN ('index', 'trigger') AND sql IS NOT NULL",
+        (sql_table,)).fetchall()
+
+
+def import_table(conn, table, records, batch_size, on_conflict, defer_indexes, progress, log):
+    sql_table = TABLES[table][0]
+    sql = insert_sql(table, on_conflict)
+
+    for name, value in BULK_LOAD_PRAGMAS:
+        conn.execute(f'PRAGMA {name} = {value}')
+
+    deferred = deferred_objects(conn, sql_table) if defer_indexes else []
+    if deferred:
+        with conn:
+            for kind, name, _ in deferred:
+                conn.execute(f'DROP {kind.upper()} IF EXISTS {name}')
+        log(f'Adiados até o fim da carga: {", ".join(name for _, name, _ in deferred)}')
+
+    # rowcount do executemany: só as linhas da tabela (total_changes contaria as dos triggers)
+    inserted = 0
+    batch = []
+    try:
+        for record in records:
+            batch.append(coerce(table, record))
+            if len(batch) >= batch_size:
+                with conn:
+                    inserted += conn.executemany(sql, batch).rowcount
+                progress.add(len(batch))
+                batch = []
+        if batch:
+            with conn:
+                inserted += conn.executemany(sql, batch).rowcount
+            progress.add(len(batch))
+    finally:
+        if deferred:
+            # Duplicatas descartadas na reconstrução não contam como inseridas
+            inserted -= rebuild_deferred(conn, table, deferred, log)
+        elif table == 'guilds':
+            with conn:
+                recount_members(conn)
+
+    return inserted
+
+
+def has_table(conn, name):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)).fetchone() is not None
+
+
+def recount_members(conn):
+    """member_count de cada guilda a partir de guild_members"""
+    conn.execute('''
+        UPDATE guilds SET member_count = (
+            SELECT COUNT(*) FROM guild_members WHERE guild_members.guild_id = guilds.id
+        )
+    ''')
+
+
+def rebuild_deferred(conn, table, deferred, log):
+    """Recria índices e triggers adiados e corrige o que eles manteriam; retorna as duplicatas removidas"""
+    started = time.perf_counter()
+    removed = 0
+    with conn:
+        if table == 'members':
+            # Sem o índice único a carga pode ter trazido duplicatas
+            removed = conn.execute('''
+                DELETE FROM guild_members WHERE id NOT IN (
+                    SELECT MIN(id) FROM guild_members GROUP BY guild_id, character_name
+                )
+            ''').rowcount
+            if removed:
+                log(f'Duplicatas descartadas: {removed}')
+        for kind, _, ddl in deferred:
+            if kind == 'index':
+                conn.execute(ddl)
+        # Os triggers de member_count estavam desligados durante a carga, e
+        # guildas importadas trazem contagens que podem não bater com os membros
+        recount_members(conn)
+        for kind, _, ddl in deferred:
+            if kind == 'trigger':
+                conn.execute(ddl)
+        if table == 'guilds' and has_table(conn, 'guilds_fts'):
+            # Os triggers do índice de busca também estavam desligados
+            conn.execute("INSERT INTO guilds_fts (guilds_fts) VALUES ('rebuild')")
+        if has_table(conn, 'guild_changes'):
+            # A carga não passou pelo registro de alterações: os consumidores precisam ressincronizar
+            conn.execute("INSERT INTO guild_changes (type) VALUES ('resync')")
+    log(f'Índices e triggers recriados em {time.perf_counter() - started:.1f}s')
+    return removed
+
+
+# ============ CLI ============
+
+def is_std(path):
+    return path in (None, '-')
+
+
+def open_text(path, mode):
+    if is_std(path):
+        return sys.stdout if 'w' in mode else sys.stdin
+    return open(path, mode, encoding='utf-8', newline='')
+
+
+def guess_format(path, fmt):
+    if fmt:
+        return fmt
+    if path and path.lower().endswith('.csv'):
+        return 'csv'
+    return 'ndjson'
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Importação/exportação em massa de guildas e membros')
+    parser.add_argument('--db', default=DEFAULT_DB_PATH, help='guilds.db (padrão: data/guilds.db)')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    for name in ('export', 'import'):
+        sub = commands.add_parser(name)
+        sub.add_argument('--table', choices=list(TABLES), required=True)
+        sub.add_argument('--format', choices=['ndjson', 'csv'],
+                         help='padrão: pela extensão do arquivo, senão ndjson')
+        sub.add_argument('--batch-size', type=int, default=10000, help='linhas por lote/transação')
+        sub.add_argument('--progress-every', type=int, default=100000, help='linhas entre relatórios (0 = só no fim)')
+
+    commands.choices['export'].add_argument('--output', help='arquivo de saída (padrão: stdout)')
+    imp = commands.choices['import']
+    imp.add_argument('--input', help='arquivo de entrada (padrão: stdin)')
+    imp.add_argument('--on-conflict', choices=list(CONFLICT_CLAUSES), default='ignore',
+                     help='o que fazer com id/nome já existentes (padrão: ignore)')
+    imp.add_argument('--keep-indexes', action='store_true',
+                     help='não adiar índices e triggers (mais lento, seguro com o serviço rodando)')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    log = lambda message: print(message, file=sys.stderr)
+
+    conn = sqlite3.connect(args.db)
+    migrate(conn, log=log)
+    progress = Progress(f'{args.command} {args.table}', args.progress_every)
+
+    try:
+        if args.command == 'export':
+            fmt = guess_format(args.output, args.format)
+            out = open_text(args.output, 'w')
+            try:
+                export_table(conn, args.table, fmt, out, args.batch_size, progress)
+            finally:
+                if is_std(args.output):
+                    out.flush()
+                else:
+                    out.close()
+        else:
+            fmt = guess_format(args.input, args.format)
+            stream = open_text(args.input, 'r')
+            try:
+                inserted = import_table(conn, args.table, read_records(fmt, stream), args.batch_size,
+                                        args.on_conflict, not args.keep_indexes, progress, log)
+            finally:
+                if not is_std(args.input):
+                    stream.close()
+            skipped = progress.count - inserted
+            log(f'Inseridas: {inserted} | ignoradas por conflito: {max(skipped, 0)}')
+    finally:
+        conn.close()
+    progress.report(final=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,198 @@
+"""
+Métricas no formato de exposição de texto do Prometheus.
+
+Implementação mínima e sem dependências: contadores e histogramas com labels,
+coletores avaliados no momento do scrape e o acompanhamento das fases de
+cada requisição (parse, SQL, serialização) por thread.
+"""
+
+import bisect
+import threading
+import time
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(names, values, extra=None):
+    pairs = [f'{name}="{escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Contador monotônico com labels"""
+
+    type_name = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in sorted(items):
+            yield f'{self.name}{format_labels(self.labelnames, key)} {format_value(value)}'
+
+
+class Histogram:
+    """Histograma com buckets fixos e labels"""
+
+    type_name = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # [contagem por bucket..., +Inf, soma]
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def samples(self):
+        with self._lock:
+            items = [(key, list(series)) for key, series in self._series.items()]
+        for key, series in sorted(items):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), series):
+                cumulative += count
+                labels = format_labels(self.labelnames, key, f'le="{format_value(float(bound))}"')
+                yield f'{self.name}_bucket{labels} {cumulative}'
+            labels = format_labels(self.labelnames, key)
+            yield f'{self.name}_sum{labels} {format_value(series[-1])}'
+            yield f'{self.name}_count{labels} {cumulative}'
+
+
+class Registry:
+    """Conjunto de métricas e coletores expostos em /metrics"""
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, *args, **kwargs):
+        return self.register(Counter(*args, **kwargs))
+
+    def histogram(self, *args, **kwargs):
+        return self.register(Histogram(*args, **kwargs))
+
+    def add_collector(self, collector):
+        """
+        'collector' é chamado a cada scrape e retorna
+        [(nome, tipo, documentação, valor)] para gauges/contadores sem labels.
+        """
+        self._collectors.append(collector)
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.type_name}')
+            lines.extend(metric.samples())
+        for collector in self._collectors:
+            for name, type_name, documentation, value in collector():
+                lines.append(f'# HELP {name} {documentation}')
+                lines.append(f'# TYPE {name} {type_name}')
+                lines.append(f'{name} {format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+# Comandos distintos guardados por requisição quando o detalhamento está ligado
+MAX_TRACKED_STATEMENTS = 64
+
+
+class RequestTimer:
+    """
+    Tempos de uma requisição: início, fim do parse, espera na admissão e SQL
+    acumulado. 'statements' ({sql: [execuções, segundos]}) só é preenchido
+    quando alguém pede o detalhamento (log de operações lentas); 'profile' é
+    o cProfile da requisição, quando sorteada. 'kind' é a classe da operação
+    ('read'/'write'), usada na escolha da conexão do pool.
+    """
+
+    __slots__ = ('started', 'parsed_at', 'queue_seconds', 'sql_seconds', 'sql_statements',
+                 'params', 'statements', 'profile', 'kind')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.parsed_at = None
+        self.queue_seconds = 0.0
+        self.sql_seconds = 0.0
+        self.sql_statements = 0
+        self.params = None
+        self.statements = None
+        self.profile = None
+        self.kind = None
+
+    def track_statement(self, sql, seconds, fetch=False):
+        statements = self.statements
+        entry = statements.get(sql)
+        if entry is None:
+            if len(statements) >= MAX_TRACKED_STATEMENTS:
+                return
+            entry = statements[sql] = [0, 0.0]
+        if not fetch:
+            entry[0] += 1
+        entry[1] += seconds
+
+    def mark_parsed(self):
+        self.parsed_at = time.perf_counter()
+
+    @property
+    def parse_seconds(self):
+        return (self.parsed_at or self.started) - self.started
+
+
+_current = threading.local()
+
+
+def begin_request():
+    """Inicia o acompanhamento da requisição na thread atual"""
+    timer = _current.timer = RequestTimer()
+    return timer
+
+
+def end_request():
+    _current.timer = None
+
+
+def current_request():
+    return getattr(_current, 'timer', None)
@@ -0,0 +1,172 @@
+"""
+Migrações versionadas do banco de guildas.
+
+A versão aplicada fica em PRAGMA user_version. Cada migração roda em sua
+própria transação e só avança a versão se todos os comandos tiverem sucesso.
+"""
+
+MIGRATIONS = [
+    (1, 'Tabelas de guildas e membros', [
+        '''
+        CREATE TABLE IF NOT EXISTS guilds (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT UNIQUE NOT NULL,
+            description TEXT,
+            leader TEXT NOT NULL,
+            member_count INTEGER DEFAULT 1
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS guild_members (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            character_name TEXT NOT NULL,
+            guild_id INTEGER,
+            rank TEXT DEFAULT 'Member',
+            join_date TEXT,
+            FOREIGN KEY (guild_id) REFERENCES guilds (id)
+        )
+        ''',
+    ]),
+    (2, 'Índice único de membros e member_count mantido por triggers', [
+        # Bancos antigos podem ter duplicatas criadas pela corrida do join_guild
+        '''
+        DELETE FROM guild_members WHERE id NOT IN (
+            SELECT MIN(id) FROM guild_members GROUP BY guild_id, character_name
+        )
+        ''',
+        # Também atende às buscas por guild_id (prefixo do índice)
+        '''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_guild_members_guild_character
+            ON guild_members (guild_id, character_name)
+        ''',
+        '''
+        UPDATE guilds SET member_count = (
+            SELECT COUNT(*) FROM guild_members WHERE guild_members.guild_id = guilds.id
+        )
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_guild_members_insert
+        AFTER INSERT ON guild_members
+        BEGIN
+            UPDATE guilds SET member_count = member_count + 1 WHERE id = NEW.guild_id;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_guild_members_delete
+        AFTER DELETE ON guild_members
+        BEGIN
+            UPDATE guilds SET member_count = member_count - 1 WHERE id = OLD.guild_id;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_guild_members_move
+        AFTER UPDATE OF guild_id ON guild_members
+        WHEN OLD.guild_id IS NOT NEW.guild_id
+        BEGIN
+            UPDATE guilds SET member_count = member_count - 1 WHERE id = OLD.guild_id;
+            UPDATE guilds SET member_count = member_count + 1 WHERE id = NEW.guild_id;
+        END
+        ''',
+    ]),
+    (3, 'Índice FTS5 de busca por nome e descrição das guildas', [
+        # Tabela de conteúdo externo: o texto fica só em guilds, o FTS guarda o índice
+        '''
+        CREATE VIRTUAL TABLE IF NOT EXISTS guilds_fts USING fts5(
+            name, description,
+            content='guilds', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2',
+            prefix='2 3'
+        )
+        ''',
+        "INSERT INTO guilds_fts (guilds_fts) VALUES ('rebuild')",
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_guilds_fts_insert
+        AFTER INSERT ON guilds
+        BEGIN
+            INSERT INTO guilds_fts (rowid, name, description) VALUES (NEW.id, NEW.name, NEW.description);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_guilds_fts_delete
+        AFTER DELETE ON guilds
+        BEGIN
+            INSERT INTO guilds_fts (guilds_fts, rowid, name, description)
+                VALUES ('delete', OLD.id, OLD.name, OLD.description);
+        END
+        ''',
+        # Só name/description: as atualizações de member_count não tocam o índice
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_guilds_fts_update
+        AFTER UPDATE OF name, description ON guilds
+        BEGIN
+            INSERT INTO guilds_fts (guilds_fts, rowid, name, description)
+                VALUES ('delete', OLD.id, OLD.name, OLD.description);
+            INSERT INTO guilds_fts (rowid, name, description) VALUES (NEW.id, NEW.name, NEW.description);
+        END
+        ''',
+    ]),
+    (4, 'Registro de alterações versionado (guild_changes)', [
+        # version cresce sempre (AUTOINCREMENT nunca reaproveita números)
+        '''
+        CREATE TABLE IF NOT EXISTS guild_changes (
+            version INTEGER PRIMARY KEY AUTOINCREMENT,
+            type TEXT NOT NULL,
+            guild_id INTEGER,
+            character_name TEXT,
+            changed_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ', 'now'))
+        )
+        ''',
+        # Triggers: toda escrita (simples, em lote ou group commit) entra na mesma transação
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_guild_changes_guild
+        AFTER INSERT ON guilds
+        BEGIN
+            INSERT INTO guild_changes (type, guild_id) VALUES ('guild_created', NEW.id);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_guild_changes_member
+        AFTER INSERT ON guild_members
+        BEGIN
+            INSERT INTO guild_changes (type, guild_id, character_name)
+                VALUES ('member_joined', NEW.guild_id, NEW.character_name);
+        END
+        ''',
+    ]),
+    (5, 'Índice de membros por guilda em ordem de id', [
+        # Paginação por keyset (get_guild_roster) e get_guild_members em ordem de
+        # entrada: sem ele, cada página varre a guilda inteira e ordena
+        '''
+        CREATE INDEX IF NOT EXISTS idx_guild_members_guild_id
+        ON guild_members (guild_id, id)
+        ''',
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def current_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def migrate(conn, target=LATEST_VERSION, log=print):
+    """Aplica as migrações pendentes até 'target'; retorna a versão final"""
+    version = current_version(conn)
+    for number, description, statements in MIGRATIONS:
+        if number <= version or number > target:
+            continue
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            for statement in statements:
+                conn.execute(statement)
+            # PRAGMA não aceita parâmetros; 'number' vem da lista acima
+            conn.execute(f'PRAGMA user_version = {int(number)}')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        version = number
+        if log:
+            log(f'Migração {number} aplicada: {description}')
+    return version
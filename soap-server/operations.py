@@ -0,0 +1,189 @@
+"""
+Registro declarativo das operações SOAP do serviço de guildas.
+
+Cada operação declara nome, parâmetros tipados, handler e se escreve no
+banco. A partir do registro saem a tabela de despacho, a conversão e
+validação dos parâmetros (montada uma vez por parâmetro) e o WSDL. A classe
+da operação (leitura/escrita) decide o limite de admissão, o tipo de conexão
+do pool (somente leitura ou não) e a invalidação do cache.
+"""
+
+from soap_serializer import SERVICE_NS, escape
+
+MISSING_FIELDS = 'Missing required fields'
+
+_XSD_TYPES = {int: 'xsd:int', str: 'xsd:string'}
+
+
+class ParamError(Exception):
+    """Parâmetro ausente ou inválido; a mensagem vira o faultstring"""
+
+
+class Param:
+    """
+    Parâmetro simples (filho direto do elemento da operação).
+    Valores vazios contam como ausentes. 'minimum' recusa valores menores;
+    'maximum' limita o valor (não recusa).
+    """
+
+    __slots__ = ('name', 'type', 'required', 'default', 'minimum', 'maximum', 'error', 'missing', 'coerce')
+
+    def __init__(self, name, type=str, required=False, default=None, minimum=None, maximum=None,
+                 error=None, missing=MISSING_FIELDS):
+        if type not in _XSD_TYPES:
+            raise ValueError(f'Unsupported parameter type: {type!r}')
+        self.name = name
+        self.type = type
+        self.required = required
+        self.default = default
+        self.minimum = minimum
+        self.maximum = maximum
+        self.error = error or f'Invalid {name}'
+        self.missing = missing
+        self.coerce = self._compile()
+
+    def _compile(self):
+        """Função de conversão com só as checagens que este parâmetro precisa"""
+        name, convert, required, default = self.name, self.type, self.required, self.default
+        minimum, maximum, error, missing = self.minimum, self.maximum, self.error, self.missing
+
+        if convert is str:
+            def coerce(params):
+                value = params.get(name)
+                if not value:
+                    if required:
+                        raise ParamError(missing)
+                    return default
+                return value
+            return coerce
+
+        def coerce(params):
+            value = params.get(name)
+            if not value:
+                if required:
+                    raise ParamError(missing)
+                return default
+            try:
+                value = convert(value)
+            except ValueError:
+                raise ParamError(error) from None
+            if minimum is not None and value < minimum:
+                raise ParamError(error)
+            if maximum is not None and value > maximum:
+                value = maximum
+            return value
+        return coerce
+
+    def xsd(self):
+        optional = '' if self.required else ' minOccurs="0"'
+        return f'<xsd:element name="{self.name}" type="{_XSD_TYPES[self.type]}"{optional}/>'
+
+
+class Operation:
+    """Operação SOAP: handler(soap_request, args) com args já convertidos"""
+
+    __slots__ = ('name', 'handler', 'params', 'write', 'cached', 'description', 'extra_xsd', 'content_xsd')
+
+    def __init__(self, name, handler, params=(), write=False, cached=False, description='',
+                 extra_xsd='', content_xsd=None):
+        self.name = name
+        self.handler = handler
+        self.params = tuple(params)
+        self.write = write
+        # cached: respostas guardadas por guild_id no cache de respostas
+        self.cached = cached
+        self.description = description
+        # extra_xsd: elementos compostos acrescentados à sequência dos parâmetros;
+        # content_xsd: substitui todo o conteúdo do complexType
+        self.extra_xsd = extra_xsd
+        self.content_xsd = content_xsd
+
+    @property
+    def kind(self):
+        return 'write' if self.write else 'read'
+
+    def coerce(self, params):
+        """Parâmetros da requisição -> dict tipado; ParamError no primeiro problema"""
+        return {param.name: param.coerce(params) for param in self.params}
+
+    def xsd(self):
+        if self.content_xsd is not None:
+            content = self.content_xsd
+        else:
+            elements = ''.join(param.xsd() for param in self.params) + self.extra_xsd
+            content = f'<xsd:sequence>{elements}</xsd:sequence>'
+        return f'<xsd:element name="{self.name}"><xsd:complexType>{content}</xsd:complexType></xsd:element>'
+
+
+class OperationRegistry:
+    """Operações por nome, na ordem de registro"""
+
+    def __init__(self):
+        self._operations = {}
+
+    def register(self, operation):
+        if operation.name in self._operations:
+            raise ValueError(f'Operation already registered: {operation.name}')
+        self._operations[operation.name] = operation
+        return operation
+
+    def get(self, name):
+        return self._operations.get(name)
+
+    def __iter__(self):
+        return iter(self._operations.values())
+
+    def __len__(self):
+        return len(self._operations)
+
+    def names(self, write=None, cached=None):
+        """Nomes das operações, opcionalmente filtrados por escrita/cache"""
+        return [
+            op.name for op in self
+            if (write is None or op.write == write) and (cached is None or op.cached == cached)
+        ]
+
+    def render_wsdl(self, location, service='GuildService'):
+        types = '\n'.join(f'            {op.xsd()}' for op in self)
+        messages = '\n'.join(
+            f'    <message name="{op.name}_request"><part name="body" element="tns:{op.name}"/></message>'
+            for op in self)
+        port_operations = '\n'.join(
+            f'        <operation name="{op.name}">'
+            f'<input message="tns:{op.name}_request"/><output message="tns:GuildResponse"/></operation>'
+            for op in self)
+        bindings = '\n'.join(
+            f'        <operation name="{op.name}"><soap:operation soapAction="{op.name}"/>'
+            f'<input><soap:body use="literal"/></input><output><soap:body use="literal"/></output></operation>'
+            for op in self)
+        return f'''<?xml version="1.0" encoding="UTF-8"?>
+<definitions xmlns="http://schemas.xmlsoap.org/wsdl/"
+             xmlns:tns="{SERVICE_NS}"
+             xmlns:soap="http://schemas.xmlsoap.org/wsdl/soap/"
+             xmlns:xsd="http://www.w3.org/2001/XMLSchema"
+             targetNamespace="{SERVICE_NS}">
+
+    <types>
+        <xsd:schema targetNamespace="{SERVICE_NS}">
+{types}
+        </xsd:schema>
+    </types>
+
+{messages}
+    <message name="GuildResponse"><part name="body" type="xsd:string"/></message>
+
+    <portType name="{service}">
+{port_operations}
+    </portType>
+
+    <binding name="{service}Binding" type="tns:{service}">
+        <soap:binding transport="http://schemas.xmlsoap.org/soap/http"/>
+{bindings}
+    </binding>
+
+    <service name="{service}">
+        <port name="{service}Port" binding="tns:{service}Binding">
+            <soap:address location="{escape(location)}"/>
+        </port>
+    </service>
+</definitions>'''
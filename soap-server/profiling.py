@@ -0,0 +1,234 @@
+"""
+Profiling sob demanda e log de operações lentas do serviço de guildas.
+
+O profiling (cProfile) é ligado em tempo de execução: por amostragem de uma
+fração das requisições e/ou para uma operação específica. Os perfis ficam em
+um anel limitado, de onde podem ser baixados. Só uma requisição é perfilada
+por vez: as outras sorteadas no meio tempo são puladas.
+
+Requisições acima do limite de tempo viram uma linha JSON no log de
+operações lentas, com as fases (parse, fila, SQL, serialização), os
+parâmetros e o EXPLAIN QUERY PLAN dos comandos executados. O EXPLAIN e a
+escrita rodam em uma thread própria, fora do caminho da requisição.
+"""
+
+import cProfile
+import io
+import json
+import logging
+import marshal
+import pstats
+import queue
+import random
+import threading
+import time
+from collections import deque
+
+MAX_PARAM_LENGTH = 200
+MAX_STATEMENTS = 20
+RECENT_SLOW_ENTRIES = 100
+
+
+class ProfileRecord:
+    """Perfil de uma requisição"""
+
+    __slots__ = ('id', 'operation', 'status', 'total_ms', 'created_at', 'stats')
+
+    def __init__(self, record_id, operation, status, total_ms, stats):
+        self.id = record_id
+        self.operation = operation
+        self.status = status
+        self.total_ms = total_ms
+        self.created_at = time.strftime('%Y-%m-%dT%H:%M:%S%z')
+        self.stats = stats
+
+    def summary(self):
+        return {
+            'id': self.id,
+            'operation': self.operation,
+            'status': self.status,
+            'total_ms': self.total_ms,
+            'created_at': self.created_at,
+        }
+
+    def dump(self):
+        """Formato de pstats.Stats.dump_stats (abre com pstats/snakeviz)"""
+        return marshal.dumps(self.stats.stats)
+
+    def text(self, sort='cumulative', limit=50):
+        out = io.StringIO()
+        # Cópia com o stream próprio: o registro é compartilhado entre requisições
+        stats = pstats.Stats(stream=out)
+        stats.add(self.stats)
+        stats.sort_stats(sort).print_stats(limit)
+        return out.getvalue()
+
+
+class RequestProfiler:
+    """Decide quais requisições perfilar e guarda os perfis em um anel"""
+
+    def __init__(self, sample_rate=0.0, operation=None, max_profiles=20):
+        self.sample_rate = sample_rate
+        self.operation = operation
+        self._profiles = deque(maxlen=max_profiles)
+        self._busy = threading.Lock()
+        self._lock = threading.Lock()
+        self._next_id = 1
+        self._skipped = 0
+
+    @property
+    def enabled(self):
+        return self.sample_rate > 0 or bool(self.operation)
+
+    def configure(self, sample_rate=None, operation=None, max_profiles=None):
+        if sample_rate is not None:
+            if not 0.0 <= sample_rate <= 1.0:
+                raise ValueError('sample_rate must be between 0 and 1')
+            self.sample_rate = sample_rate
+        if operation is not None:
+            self.operation = operation or None
+        if max_profiles is not None:
+            if max_profiles <= 0:
+                raise ValueError('max_profiles must be positive')
+            with self._lock:
+                self._profiles = deque(self._profiles, maxlen=max_profiles)
+
+    def start(self, operation):
+        """cProfile.Profile já ligado, ou None se esta requisição não for perfilada"""
+        if not (operation == self.operation or (self.sample_rate and random.random() < self.sample_rate)):
+            return None
+        # Um perfil por vez: o cProfile não lida bem com vários ativos no processo
+        if not self._busy.acquire(blocking=False):
+            with self._lock:
+                self._skipped += 1
+            return None
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            self._busy.release()
+            return None
+        return profile
+
+    def finish(self, profile, operation, status, total_ms):
+        """Desliga o perfil e o guarda no anel; retorna o id"""
+        try:
+            profile.disable()
+        finally:
+            self._busy.release()
+        stats = pstats.Stats(profile)
+        with self._lock:
+            record = ProfileRecord(self._next_id, operation, status, total_ms, stats)
+            self._next_id += 1
+            self._profiles.append(record)
+        return record.id
+
+    def get(self, record_id):
+        with self._lock:
+            for record in self._profiles:
+                if record.id == record_id:
+                    return record
+        return None
+
+    def stats(self):
+        with self._lock:
+            return {
+                'sample_rate': self.sample_rate,
+                'operation': self.operation,
+                'max_profiles': self._profiles.maxlen,
+                'skipped_busy': self._skipped,
+                'profiles': [record.summary() for record in self._profiles],
+            }
+
+
+def clip(value):
+    """Parâmetros longos são cortados antes de ir para o log"""
+    if isinstance(value, str) and len(value) > MAX_PARAM_LENGTH:
+        return value[:MAX_PARAM_LENGTH] + '...'
+    return value
+
+
+class SlowOperationLog:
+    """Log estruturado (JSON por linha) das requisições acima do limite"""
+
+    def __init__(self, threshold_ms, logger, explain=None, queue_size=256):
+        # threshold_ms <= 0 desliga o log
+        self.threshold_ms = threshold_ms
+        self.logger = logger
+        # explain(sql) -> lista com o plano, chamado na thread do log
+        self.explain = explain
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._recent = deque(maxlen=RECENT_SLOW_ENTRIES)
+        self._lock = threading.Lock()
+        self._logged = 0
+        self._dropped = 0
+        self._thread = None
+
+    @property
+    def enabled(self):
+        return self.threshold_ms > 0
+
+    def configure(self, threshold_ms):
+        if threshold_ms < 0:
+            raise ValueError('slow_ms must not be negative')
+        self.threshold_ms = threshold_ms
+
+    def reset(self):
+        """Após um fork: a thread do log não existe no processo filho"""
+        self._thread = None
+        self._queue = queue.Queue(maxsize=self._queue.maxsize)
+
+    def submit(self, entry, statements):
+        """Enfileira uma entrada; 'statements' é {sql: [execuções, segundos]}"""
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='guild-slow-log', daemon=True)
+                    self._thread.start()
+        try:
+            self._queue.put_nowait((entry, statements))
+        except queue.Full:
+            with self._lock:
+                self._dropped += 1
+
+    def _run(self):
+        while True:
+            entry, statements = self._queue.get()
+            try:
+                entry['statements'] = self._describe(statements)
+                self.logger.warning(json.dumps(entry, ensure_ascii=False, default=str))
+            except Exception:
+                logging.getLogger(__name__).exception('Falha ao registrar operação lenta')
+                continue
+            with self._lock:
+                self._logged += 1
+                self._recent.append(entry)
+
+    def _describe(self, statements):
+        """Comandos mais caros primeiro, com o plano de cada um"""
+        described = []
+        ordered = sorted((statements or {}).items(), key=lambda item: item[1][1], reverse=True)
+        for sql, (count, seconds) in ordered[:MAX_STATEMENTS]:
+            item = {'sql': ' '.join(sql.split()), 'executions': count, 'sql_ms': round(seconds * 1000.0, 3)}
+            if self.explain is not None:
+                try:
+                    plan = self.explain(sql)
+                except Exception as e:
+                    plan = [f'unavailable: {e}']
+                if plan is not None:
+                    item['plan'] = plan
+            described.append(item)
+        return described
+
+    def stats(self):
+        with self._lock:
+            return {
+                'threshold_ms': self.threshold_ms,
+                'logged': self._logged,
+                'dropped': self._dropped,
+                'queued': self._queue.qsize(),
+            }
+
+    def recent(self):
+        with self._lock:
+            return list(self._recent)
@@ -0,0 +1,111 @@
+"""
+Cache LRU de respostas serializadas do serviço SOAP de guildas.
+
+As entradas são indexadas por (operação, guild_id), têm tamanho máximo e TTL,
+e são invalidadas explicitamente pelas operações de escrita.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+# 'encoded' guarda as variantes comprimidas do corpo (codificação -> bytes)
+CacheEntry = namedtuple('CacheEntry', ['body', 'etag', 'expires_at', 'encoded'])
+
+
+def make_etag(body):
+    """ETag forte (sem aspas) calculada a partir do corpo serializado"""
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    return hashlib.blake2b(body, digest_size=12).hexdigest()
+
+
+class ResponseCache:
+    """LRU com TTL, seguro entre threads"""
+
+    def __init__(self, max_entries=1024, ttl=30.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Incrementado a cada invalidação; impede que uma leitura iniciada
+        # antes de uma escrita grave no cache um valor já desatualizado
+        self._epoch = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.stale_puts = 0
+
+    @property
+    def epoch(self):
+        return self._epoch
+
+    def get(self, key):
+        """Retorna a entrada válida para 'key' ou None"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry.expires_at <= now:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, body, epoch):
+        """
+        Guarda 'body' para 'key' e retorna a entrada criada.
+        Se houve invalidação desde 'epoch', a entrada é devolvida sem ser guardada.
+        """
+        entry = CacheEntry(body, make_etag(body), time.monotonic() + self.ttl, {})
+        if self.max_entries <= 0:
+            return entry
+        with self._lock:
+            if epoch != self._epoch:
+                self.stale_puts += 1
+                return entry
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return entry
+
+    def invalidate(self, *keys):
+        """Remove as chaves informadas"""
+        with self._lock:
+            self._epoch += 1
+            for key in keys:
+                if self._entries.pop(key, None) is not None:
+                    self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._epoch += 1
+            self._entries.clear()
+
+    def stats(self):
+        """Contadores de uso do cache"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+                'stale_puts': self.stale_puts,
+            }
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Ponto de entrada de produção do serviço SOAP de guildas.
+
+Usa o Gunicorn (vários processos, cada um com um pool de threads) quando
+disponível; no Windows, onde o Gunicorn não roda, usa o Waitress (um processo,
+várias threads). Sem nenhum dos dois, cai no servidor do Werkzeug com threads,
+sem reloader nem debugger.
+
+Configuração por flags ou variáveis de ambiente:
+    SOAP_HOST, SOAP_PORT, SOAP_WORKERS, SOAP_THREADS, SOAP_TIMEOUT,
+    SOAP_GRACEFUL_TIMEOUT, SOAP_SERVER (auto|gunicorn|waitress|werkzeug)
+
+Uso:
+    python serve.py --host 0.0.0.0 --port 8000 --workers 4 --threads 8
+"""
+
+import argparse
+import atexit
+import os
+import signal
+import sys
+
+
+def env_int(name, default):
+    value = os.environ.get(name)
+    return int(value) if value else default
+
+
+def default_workers():
+    return max((os.cpu_count() or 1), 1)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Servidor de produção do serviço SOAP de guildas')
+    parser.add_argument('--host', default=os.environ.get('SOAP_HOST', 'localhost'))
+    parser.add_argument('--port', type=int, default=env_int('SOAP_PORT', 8000))
+    parser.add_argument('--workers', type=int, default=env_int('SOAP_WORKERS', default_workers()),
+                        help='processos de trabalho (padrão: número de CPUs)')
+    parser.add_argument('--threads', type=int, default=env_int('SOAP_THREADS', 4),
+                        help='threads por processo')
+    parser.add_argument('--timeout', type=int, default=env_int('SOAP_TIMEOUT', 30),
+                        help='segundos até um worker travado ser reiniciado')
+    parser.add_argument('--graceful-timeout', type=int, default=env_int('SOAP_GRACEFUL_TIMEOUT', 30),
+                        help='segundos para concluir as requisições em andamento no desligamento')
+    parser.add_argument('--server', choices=['auto', 'gunicorn', 'waitress', 'werkzeug'],
+                        default=os.environ.get('SOAP_SERVER', 'auto'))
+    return parser.parse_args(argv)
+
+
+def choose_server(requested):
+    if requested != 'auto':
+        return requested
+    if sys.platform != 'win32':
+        try:
+            import gunicorn  # noqa: F401
+            return 'gunicorn'
+        except ImportError:
+            pass
+    try:
+        import waitress  # noqa: F401
+        return 'waitress'
+    except ImportError:
+        return 'werkzeug'
+
+
+def configure_cache(workers):
+    """
+    O cache de respostas é por processo: uma escrita em um worker não invalida
+    os outros. Com vários workers, sem TTL explícito, o TTL padrão é reduzido
+    para limitar o tempo em que uma resposta antiga pode ser servida.
+    """
+    if workers > 1 and 'GUILDS_CACHE_TTL' not in os.environ:
+        os.environ['GUILDS_CACHE_TTL'] = '2'
+
+
+def configure_sse(threads):
+    """
+    Cada stream de /changes/stream prende uma thread do processo enquanto
+    estiver aberto. Para que os assinantes não tomem todas as threads e
+    parem o tráfego SOAP, no máximo metade delas atende streams (com uma
+    thread só, o stream fica desligado e responde 503).
+    """
+    limit = threads // 2
+    requested = os.environ.get('GUILDS_SSE_MAX_SUBSCRIBERS')
+    if requested and int(requested) <= limit:
+        return
+    if requested:
+        print(f'GUILDS_SSE_MAX_SUBSCRIBERS={requested} ocuparia as {threads} threads do processo: '
+              f'usando {limit}', file=sys.stderr)
+    os.environ['GUILDS_SSE_MAX_SUBSCRIBERS'] = str(limit)
+
+
+def run_gunicorn(server, args):
+    from gunicorn.app.base import BaseApplication
+
+    class GuildServiceApplication(BaseApplication):
+        def __init__(self, options):
+            self.options = options
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return server.app
+
+    def post_fork(_arbiter, _worker):
+        server.reset_worker_state()
+
+    def worker_exit(_arbiter, _worker):
+        server.close_pool()
+
+    options = {
+        'bind': f'{args.host}:{args.port}',
+        'workers': args.workers,
+        'threads': args.threads,
+        'worker_class': 'gthread' if args.threads > 1 else 'sync',
+        'timeout': args.timeout,
+        'graceful_timeout': args.graceful_timeout,
+        'keepalive': 5,
+        # O app é importado uma vez no master; o estado de banco nasce em cada worker
+        'preload_app': True,
+        'post_fork': post_fork,
+        'worker_exit': worker_exit,
+        'accesslog': None,
+    }
+    GuildServiceApplication(options).run()
+
+
+def run_waitress(server, args):
+    import waitress
+
+    if args.workers > 1:
+        print(f'Waitress usa um único processo: --workers {args.workers} ignorado, '
+              f'usando {args.threads} threads', file=sys.stderr)
+    waitress.serve(server.app, host=args.host, port=args.port, threads=args.threads,
+                   channel_timeout=args.timeout)
+
+
+def run_werkzeug(server, args):
+    from werkzeug.serving import run_simple
+
+    if args.server == 'auto':
+        print('Gunicorn/Waitress não instalados: usando o servidor do Werkzeug com threads '
+              '(pip install -r requirements-prod.txt)', file=sys.stderr)
+    run_simple(args.host, args.port, server.app, threaded=True,
+               use_reloader=False, use_debugger=False)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    kind = choose_server(args.server)
+    workers = args.workers if kind == 'gunicorn' else 1
+    configure_cache(workers)
+    if kind != 'werkzeug':
+        # O Werkzeug cria uma thread por conexão; Gunicorn e Waitress têm um número fixo
+        configure_sse(args.threads)
+
+    # Importado só agora: a configuração do servidor vem do ambiente
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import soap_server_simple as server
+
+    # Migrações rodam uma única vez, antes de qualquer worker existir
+    server.init_database()
+
+    print("=== Ashen Network SOAP Server (produção) ===")
+    print(f"Servidor: {kind} | {workers} processo(s) x {args.threads} thread(s)")
+    print(f"WSDL disponível em: http://{args.host}:{args.port}/")
+    print(f"SOAP Endpoint: http://{args.host}:{args.port}/soap")
+    print("============================================")
+
+    if kind == 'gunicorn':
+        run_gunicorn(server, args)
+        return
+
+    # Waitress/Werkzeug: SIGTERM encerra como um Ctrl+C e o pool é fechado na saída
+    atexit.register(server.close_pool)
+    if hasattr(signal, 'SIGTERM'):
+        signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        if kind == 'waitress':
+            run_waitress(server, args)
+        else:
+            run_werkzeug(server, args)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
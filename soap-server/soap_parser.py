@@ -0,0 +1,113 @@
+"""
+Parser de requisições SOAP do serviço de guildas.
+
+Lê o envelope em uma única passada incremental (XMLPullParser) e devolve a
+operação (primeiro filho de soap:Body) junto com todos os seus parâmetros.
+"""
+
+import xml.etree.ElementTree as ET
+
+SOAP_ENV_NS = 'http://schemas.xmlsoap.org/soap/envelope/'
+ENVELOPE_TAG = f'{{{SOAP_ENV_NS}}}Envelope'
+BODY_TAG = f'{{{SOAP_ENV_NS}}}Body'
+
+
+class SoapParseError(Exception):
+    """Envelope SOAP malformado ou sem operação"""
+
+
+class SoapRequest:
+    """Operação SOAP já decodificada"""
+
+    __slots__ = ('operation', 'params', 'element')
+
+    def __init__(self, operation, params, element):
+        self.operation = operation
+        # Parâmetros simples: nome local -> texto
+        self.params = params
+        # Elemento da operação, para operações com parâmetros aninhados
+        self.element = element
+
+    def get(self, name, default=None):
+        return self.params.get(name, default)
+
+
+def local_name(tag):
+    """Remove o namespace de uma tag ('{ns}name' -> 'name')"""
+    return tag.rsplit('}', 1)[-1]
+
+
+def operation_from_soap_action(header):
+    """Extrai o nome da operação do cabeçalho SOAPAction"""
+    if not header:
+        return None
+    action = header.strip().strip('"').rstrip('/')
+    # Aceita tanto 'join_guild' quanto 'http://ashennetwork.soap/guild/join_guild'
+    for sep in ('/', '#', ':'):
+        action = action.rsplit(sep, 1)[-1]
+    return action or None
+
+
+def parse_soap_request(data, soap_action=None):
+    """
+    Faz o parse do envelope e retorna um SoapRequest.
+    A operação vem do primeiro filho de soap:Body; o SOAPAction é usado
+    apenas quando o Body está vazio.
+    """
+    parser = ET.XMLPullParser(events=('start', 'end'))
+    depth = 0
+    in_body = False
+    current = None
+    operation_elem = None
+    params = {}
+
+    try:
+        parser.feed(data)
+        parser.close()
+        for event, elem in parser.read_events():
+            if event == 'start':
+                depth += 1
+                if depth == 1 and elem.tag != ENVELOPE_TAG:
+                    raise SoapParseError('Missing SOAP Envelope')
+                if depth == 2 and elem.tag == BODY_TAG:
+                    in_body = True
+                elif depth == 3 and in_body:
+                    current = elem
+                    if operation_elem is None:
+                        operation_elem = elem
+                continue
+
+            # event == 'end': parâmetros simples são os filhos diretos da operação
+            if depth == 4 and in_body and current is operation_elem and len(elem) == 0:
+                params.setdefault(local_name(elem.tag), (elem.text or '').strip())
+            elif depth == 2 and elem.tag == BODY_TAG:
+                in_body = False
+            depth -= 1
+    except ET.ParseError as e:
+        raise SoapParseError(f'Malformed SOAP request: {e}') from None
+
+    if operation_elem is not None:
+        return SoapRequest(local_name(operation_elem.tag), params, operation_elem)
+
+    operation = operation_from_soap_action(soap_action)
+    if operation is None:
+        raise SoapParseError('Missing SOAP operation')
+    return SoapRequest(operation, params, None)
+
+
+def element_params(elem):
+    """Filhos simples de um elemento como dicionário nome local -> texto"""
+    params = {}
+    for child in elem:
+        if len(child) == 0:
+            params.setdefault(local_name(child.tag), (child.text or '').strip())
+    return params
+
+
+def iter_children(elem, tag=None):
+    """Filhos diretos de um elemento, opcionalmente filtrados pelo nome local"""
+    if elem is None:
+        return
+    for child in elem:
+        if tag is None or local_name(child.tag) == tag:
+            yield child
@@ -0,0 +1,195 @@
+"""
+Serialização das respostas SOAP do serviço de guildas.
+
+Os envelopes de cada operação são montados uma única vez, já em bytes e sem
+espaços insignificantes. As linhas do banco são escritas em um único buffer
+com escape de XML, e o corpo pode ser comprimido (gzip/deflate) conforme o
+Accept-Encoding do cliente.
+"""
+
+import zlib
+from functools import lru_cache
+
+SOAP_ENV_NS = 'http://schemas.xmlsoap.org/soap/envelope/'
+SERVICE_NS = 'http://ashennetwork.soap/guild'
+
+XML_DECLARATION = '<?xml version="1.0" encoding="UTF-8"?>'
+
+# Corpos menores que isto não compensam o custo da compressão
+MIN_COMPRESS_SIZE = 1024
+COMPRESSION_LEVEL = 6
+
+# wbits do zlib: 31 = container gzip, 15 = container zlib ("deflate" do HTTP)
+_WBITS = {'gzip': 31, 'deflate': 15}
+
+
+def escape(value):
+    """Escape de texto XML; o caminho comum (sem &, < ou >) não copia a string"""
+    if value is None:
+        return ''
+    if not isinstance(value, str):
+        return str(value)
+    if '&' in value:
+        value = value.replace('&', '&amp;')
+    if '<' in value:
+        value = value.replace('<', '&lt;')
+    if '>' in value:
+        value = value.replace('>', '&gt;')
+    return value
+
+
+@lru_cache(maxsize=None)
+def envelope_parts(operation):
+    """Início e fim (bytes) do envelope de resposta de uma operação"""
+    prefix = (f'{XML_DECLARATION}<soap:Envelope xmlns:soap="{SOAP_ENV_NS}" xmlns:tns="{SERVICE_NS}">'
+              f'<soap:Body><tns:{operation}Response>')
+    suffix = f'</tns:{operation}Response></soap:Body></soap:Envelope>'
+    return prefix.encode('utf-8'), suffix.encode('utf-8')
+
+
+def envelope(operation, content):
+    """Envelope completo com o conteúdo (str) da resposta"""
+    prefix, suffix = envelope_parts(operation)
+    return b''.join((prefix, content.encode('utf-8'), suffix))
+
+
+def fault(message, code='Server'):
+    """Envelope de SOAP Fault"""
+    return (f'{XML_DECLARATION}<soap:Envelope xmlns:soap="{SOAP_ENV_NS}"><soap:Body>'
+            f'<soap:Fault><faultcode>{escape(code)}</faultcode><faultstring>{escape(message)}</faultstring>'
+            f'</soap:Fault></soap:Body></soap:Envelope>').encode('utf-8')
+
+
+def guild_rows(rows):
+    """(id, name, description, leader, member_count) -> XML de <guild>"""
+    parts = []
+    append = parts.append
+    for guild_id, name, description, leader, member_count in rows:
+        append('<guild><id>')
+        append(str(guild_id))
+        append('</id><name>')
+        append(escape(name))
+        append('</name><description>')
+        append(escape(description))
+        append('</description><leader>')
+        append(escape(leader))
+        append('</leader><member_count>')
+        append(str(member_count))
+        append('</member_count></guild>')
+    return ''.join(parts)
+
+
+def member_rows(rows):
+    """(id, character_name, guild_id, rank, join_date) -> XML de <member>"""
+    parts = []
+    append = parts.append
+    for member_id, character_name, guild_id, rank, join_date in rows:
+        append('<member><id>')
+        append(str(member_id))
+        append('</id><character_name>')
+        append(escape(character_name))
+        append('</character_name><guild_id>')
+        append(str(guild_id))
+        append('</guild_id><rank>')
+        append(escape(rank))
+        append('</rank><join_date>')
+        append(escape(join_date))
+        append('</join_date></member>')
+    return ''.join(parts)
+
+
+def roster_rows(rows):
+    """
+    (id, character_name, guild_id, rank, join_date, character_id, level, item_count)
+    -> XML de <member>; os campos do personagem ficam vazios se ele não existir
+    """
+    parts = []
+    append = parts.append
+    for member_id, character_name, guild_id, rank, join_date, character_id, level, item_count in rows:
+        append('<member><id>')
+        append(str(member_id))
+        append('</id><character_name>')
+        append(escape(character_name))
+        append('</character_name><guild_id>')
+        append(str(guild_id))
+        append('</guild_id><rank>')
+        append(escape(rank))
+        append('</rank><join_date>')
+        append(escape(join_date))
+        append('</join_date><character_id>')
+        append(escape(character_id))
+        append('</character_id><level>')
+        append(escape(level))
+        append('</level><item_count>')
+        append(escape(item_count))
+        append('</item_count></member>')
+    return ''.join(parts)
+
+
+def change_rows(rows):
+    """(version, type, guild_id, character_name, changed_at) -> XML de <change>"""
+    parts = []
+    append = parts.append
+    for version, change_type, guild_id, character_name, changed_at in rows:
+        append('<change><version>')
+        append(str(version))
+        append('</version><type>')
+        append(escape(change_type))
+        append('</type><guild_id>')
+        append(escape(guild_id))
+        append('</guild_id><character_name>')
+        append(escape(character_name))
+        append('</character_name><changed_at>')
+        append(escape(changed_at))
+        append('</changed_at></change>')
+    return ''.join(parts)
+
+
+def element(tag, value):
+    """<tag>valor escapado</tag>"""
+    return f'<{tag}>{escape(value)}</{tag}>'
+
+
+# ============ COMPRESSÃO ============
+
+def negotiate_encoding(accept_encoding):
+    """
+    Escolhe gzip ou deflate a partir do Accept-Encoding (respeitando q=0).
+    Retorna None quando o cliente não aceita nenhum dos dois.
+    """
+    if not accept_encoding:
+        return None
+    best, best_q = None, 0.0
+    for item in accept_encoding.split(','):
+        name, _, params = item.strip().partition(';')
+        name = name.strip().lower()
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if name == '*':
+            name = 'gzip'
+        # Em empate, gzip vence
+        if name in _WBITS and (q > best_q or (q == best_q and q > 0 and name == 'gzip')):
+            best, best_q = name, q
+    return best
+
+
+def compress(body, encoding, level=COMPRESSION_LEVEL):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, _WBITS[encoding])
+    return compressor.compress(body) + compressor.flush()
+
+
+def compress_stream(chunks, encoding, level=COMPRESSION_LEVEL):
+    """Comprime uma sequência de blocos sem acumulá-los em memória"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, _WBITS[encoding])
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
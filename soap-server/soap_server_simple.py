@@ -1,368 +1,1291 @@
-from flask import Flask, request, Response, render_template_string
+from flask import Flask, request, Response, render_template_string, jsonify
 from flask_cors import CORS
 import sqlite3
+import hmac
+import logging
 import os
+import pathlib
+import re
+import threading
+import time
 from datetime import datetime
+from functools import lru_cache, wraps
+
+
+import admission
+import change_feed
+import metrics
+import profiling
+import soap_serializer as serializer
+from db_pool import ConnectionPool, TimedConnection
+from group_commit import GroupCommitWriter, WriterBusy
+from migrations import migrate
+from operations import Operation, OperationRegistry, Param, ParamError
+from response_cache import ResponseCache, make_etag
+from soap_parser import SoapParseError, element_params, iter_children, local_name, parse_soap_request
+from soap_serializer import escape
 
 app = Flask(__name__)
 CORS(app)
 
+DB_PATH = os.environ.get(
+    'GUILDS_DB_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'guilds.db'),
+)
+# Banco de personagens do serviço REST, anexado somente leitura (get_guild_roster)
+CHARACTERS_DB_PATH = os.environ.get(
+    'GUILDS_CHARACTERS_DB_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'dark_souls.db'),
+)
+DB_POOL_SIZE = int(os.environ.get('GUILDS_DB_POOL_SIZE', '8'))
+
+# Endereço anunciado no WSDL
+WSDL_LOCATION = os.environ.get('GUILDS_SOAP_LOCATION', 'http://localhost:8000/soap')
+
+# Paginação de get_all_guilds
+STREAM_CHUNK_SIZE = 500
+MAX_PAGE_SIZE = 1000
+
+# Busca textual (search_guilds)
+SEARCH_DEFAULT_LIMIT = 20
+MAX_SEARCH_LIMIT = 100
+
+# Feed de alterações (get_changes_since e /changes/stream)
+CHANGES_DEFAULT_LIMIT = 500
+MAX_CHANGES_LIMIT = 1000
+CHANGE_POLL_SECONDS = float(os.environ.get('GUILDS_CHANGE_POLL', '1'))
+SSE_HEARTBEAT_SECONDS = 15
+# Cada stream ocupa uma thread do servidor enquanto estiver aberto: o serve.py
+# limita este valor a metade das threads de cada processo
+MAX_SSE_SUBSCRIBERS = int(os.environ.get('GUILDS_SSE_MAX_SUBSCRIBERS', '64'))
+
+# Operações em lote
+MAX_BATCH_ITEMS = 50000
+SQL_IN_CHUNK_SIZE = 500
+
+# Cache de respostas de get_guild_by_id/get_guild_members
+CACHE_MAX_ENTRIES = int(os.environ.get('GUILDS_CACHE_SIZE', '1024'))
+CACHE_TTL_SECONDS = float(os.environ.get('GUILDS_CACHE_TTL', '30'))
+
+# Group commit de create_guild/join_guild (desligado por padrão)
+GROUP_COMMIT = os.environ.get('GUILDS_GROUP_COMMIT', '').lower() in ('1', 'true', 'yes', 'on')
+GROUP_COMMIT_MAX_BATCH = int(os.environ.get('GUILDS_GROUP_COMMIT_BATCH', '64'))
+GROUP_COMMIT_DELAY_MS = float(os.environ.get('GUILDS_GROUP_COMMIT_DELAY_MS', '5'))
+GROUP_COMMIT_QUEUE_SIZE = int(os.environ.get('GUILDS_GROUP_COMMIT_QUEUE', '1024'))
+
+# Controle de admissão por classe de operação (0 desliga o limite)
+MAX_CONCURRENT_READS = int(os.environ.get('GUILDS_MAX_CONCURRENT_READS', '32'))
+# Com group commit, escritas simultâneas são o que enche os lotes
+MAX_CONCURRENT_WRITES = int(os.environ.get(
+    'GUILDS_MAX_CONCURRENT_WRITES', str(GROUP_COMMIT_MAX_BATCH if GROUP_COMMIT else 4)))
+ADMISSION_QUEUE_SIZE = int(os.environ.get('GUILDS_ADMISSION_QUEUE', '64'))
+ADMISSION_MAX_WAIT_MS = float(os.environ.get('GUILDS_ADMISSION_WAIT_MS', '250'))
+RETRY_AFTER_SECONDS = os.environ.get('GUILDS_RETRY_AFTER', '1')
+# Orçamento do cliente, em milissegundos a partir do recebimento da requisição
+DEADLINE_HEADER = 'X-Request-Timeout-Ms'
+
+# Profiling sob demanda (também ajustável em /admin/profiling) e log de operações lentas
+PROFILE_SAMPLE_RATE = float(os.environ.get('GUILDS_PROFILE_SAMPLE', '0'))
+PROFILE_OPERATION = os.environ.get('GUILDS_PROFILE_OPERATION') or None
+PROFILE_RING_SIZE = int(os.environ.get('GUILDS_PROFILE_RING', '20'))
+SLOW_OPERATION_MS = float(os.environ.get('GUILDS_SLOW_MS', '1000'))
+SLOW_LOG_PATH = os.environ.get('GUILDS_SLOW_LOG')
+# Sem token, os endpoints /admin só atendem conexões locais
+ADMIN_TOKEN = os.environ.get('GUILDS_ADMIN_TOKEN')
+ADMIN_TOKEN_HEADER = 'X-Admin-Token'
+
+_pool = None
+_writer = None
+_pool_lock = threading.Lock()
+
+response_cache = ResponseCache(CACHE_MAX_ENTRIES, CACHE_TTL_SECONDS)
+change_notifier = change_feed.ChangeNotifier()
+sse_subscribers = change_feed.SubscriberLimit(MAX_SSE_SUBSCRIBERS)
+admission_limiters = {
+    'read': admission.AdmissionLimiter('read', MAX_CONCURRENT_READS, ADMISSION_QUEUE_SIZE,
+                                       ADMISSION_MAX_WAIT_MS / 1000.0),
+    'write': admission.AdmissionLimiter('write', MAX_CONCURRENT_WRITES, ADMISSION_QUEUE_SIZE,
+                                        ADMISSION_MAX_WAIT_MS / 1000.0),
+}
+
 # Inicializar banco de dados
-def init_database():
-    db_path = os.path.join(os.path.dirname(__file__), '..', 'data', 'guilds.db')
+def init_database(log=print):
+    """Cria o banco se necessário e aplica as migrações pendentes ('log' recebe o andamento)"""
+    db_path = DB_PATH
     os.makedirs(os.path.dirname(db_path), exist_ok=True)
     
     conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    
-    # Criar tabela de guildas
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS guilds (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT UNIQUE NOT NULL,
-            description TEXT,
-            leader TEXT NOT NULL,
-            member_count INTEGER DEFAULT 1
-        )
-    ''')
-    
-    # Criar tabela de membros
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS guild_members (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            character_name TEXT NOT NULL,
-            guild_id INTEGER,
-            rank TEXT DEFAULT 'Member',
-            join_date TEXT,
-            FOREIGN KEY (guild_id) REFERENCES guilds (id)
-        )
-    ''')
+    try:
+        migrate(conn, log=log)
+    finally:
+        conn.close()
     
     # Não inserir dados de exemplo - deixar banco vazio para testes
-    # cursor.execute('SELECT COUNT(*) FROM guilds')
-    # if cursor.fetchone()[0] == 0:
-    #     # Dados de exemplo comentados
-    #     pass
-    
-    conn.commit()
-    conn.close()
-
-def get_db_connection():
-    db_path = os.path.join(os.path.dirname(__file__), '..', 'data', 'guilds.db')
-    return sqlite3.connect(db_path)
-
-# WSDL Simplificado
-WSDL_TEMPLATE = '''<?xml version="1.0" encoding="UTF-8"?>
-<definitions xmlns="http://schemas.xmlsoap.org/wsdl/"
-             xmlns:tns="http://ashennetwork.soap/guild"
-             xmlns:soap="http://schemas.xmlsoap.org/wsdl/soap/"
-             xmlns:xsd="http://www.w3.org/2001/XMLSchema"
-             targetNamespace="http://ashennetwork.soap/guild">
-
-    <types>
-        <xsd:schema targetNamespace="http://ashennetwork.soap/guild">
-            <xsd:element name="get_all_guilds"/>
-            <xsd:element name="get_guild_by_id">
-                <xsd:complexType><xsd:sequence>
-                    <xsd:element name="guild_id" type="xsd:int"/>
-                </xsd:sequence></xsd:complexType>
-            </xsd:element>
-            <xsd:element name="create_guild">
-                <xsd:complexType><xsd:sequence>
-                    <xsd:element name="name" type="xsd:string"/>
-                    <xsd:element name="description" type="xsd:string"/>
-                    <xsd:element name="leader" type="xsd:string"/>
-                </xsd:sequence></xsd:complexType>
-            </xsd:element>
-            <xsd:element name="join_guild">
-                <xsd:complexType><xsd:sequence>
-                    <xsd:element name="guild_id" type="xsd:int"/>
-                    <xsd:element name="character_name" type="xsd:string"/>
-                </xsd:sequence></xsd:complexType>
-            </xsd:element>
-            <xsd:element name="get_guild_members">
-                <xsd:complexType><xsd:sequence>
-                    <xsd:element name="guild_id" type="xsd:int"/>
-                </xsd:sequence></xsd:complexType>
-            </xsd:element>
-        </xsd:schema>
-    </types>
-
-    <message name="GuildRequest"><part name="body" element="tns:get_all_guilds"/></message>
-    <message name="GuildByIdRequest"><part name="body" element="tns:get_guild_by_id"/></message>
-    <message name="CreateGuildRequest"><part name="body" element="tns:create_guild"/></message>
-    <message name="JoinGuildRequest"><part name="body" element="tns:join_guild"/></message>
-    <message name="MembersRequest"><part name="body" element="tns:get_guild_members"/></message>
-    <message name="GuildResponse"><part name="body" type="xsd:string"/></message>
-
-    <portType name="GuildService">
-        <operation name="get_all_guilds">
-            <input message="tns:GuildRequest"/>
-            <output message="tns:GuildResponse"/>
-        </operation>
-        <operation name="get_guild_by_id">
-            <input message="tns:GuildByIdRequest"/>
-            <output message="tns:GuildResponse"/>
-        </operation>
-        <operation name="create_guild">
-            <input message="tns:CreateGuildRequest"/>
-            <output message="tns:GuildResponse"/>
-        </operation>
-        <operation name="join_guild">
-            <input message="tns:JoinGuildRequest"/>
-            <output message="tns:GuildResponse"/>
-        </operation>
-        <operation name="get_guild_members">
-            <input message="tns:MembersRequest"/>
-            <output message="tns:GuildResponse"/>
-        </operation>
-    </portType>
-
-    <binding name="GuildServiceBinding" type="tns:GuildService">
-        <soap:binding transport="http://schemas.xmlsoap.org/soap/http"/>
-        <operation name="get_all_guilds">
-            <soap:operation soapAction="get_all_guilds"/>
-            <input><soap:body use="literal"/></input>
-            <output><soap:body use="literal"/></output>
-        </operation>
-        <operation name="get_guild_by_id">
-            <soap:operation soapAction="get_guild_by_id"/>
-            <input><soap:body use="literal"/></input>
-            <output><soap:body use="literal"/></output>
-        </operation>
-        <operation name="create_guild">
-            <soap:operation soapAction="create_guild"/>
-            <input><soap:body use="literal"/></input>
-            <output><soap:body use="literal"/></output>
-        </operation>
-        <operation name="join_guild">
-            <soap:operation soapAction="join_guild"/>
-            <input><soap:body use="literal"/></input>
-            <output><soap:body use="literal"/></output>
-        </operation>
-        <operation name="get_guild_members">
-            <soap:operation soapAction="get_guild_members"/>
-            <input><soap:body use="literal"/></input>
-            <output><soap:body use="literal"/></output>
-        </operation>
-    </binding>
-
-    <service name="GuildService">
-        <port name="GuildServicePort" binding="tns:GuildServiceBinding">
-            <soap:address location="http://localhost:8000/soap"/>
-        </port>
-    </service>
-</definitions>'''
+
+def get_pool():
+    """Retorna o pool de conexões, criando-o no primeiro uso"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(DB_PATH, max_size=DB_POOL_SIZE, statement_observer=observe_sql, uri=True)
+    return _pool
+
+def get_writer():
+    """Retorna a thread escritora do group commit, criando-a no primeiro uso"""
+    global _writer
+    if _writer is None:
+        with _pool_lock:
+            if _writer is None:
+                _writer = GroupCommitWriter(
+                    get_db_connection,
+                    max_batch=GROUP_COMMIT_MAX_BATCH,
+                    max_delay=GROUP_COMMIT_DELAY_MS / 1000.0,
+                    queue_size=GROUP_COMMIT_QUEUE_SIZE,
+                )
+    return _writer
+
+def close_pool():
+    """Fecha o escritor e o pool atuais; o próximo uso cria outros"""
+    global _pool, _writer
+    with _pool_lock:
+        writer, _writer = _writer, None
+    # O escritor confirma o que já está na fila antes de o pool fechar
+    if writer is not None:
+        writer.close()
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.close()
+
+def reset_worker_state():
+    """
+    Descarta o estado herdado do processo pai após um fork: conexões SQLite
+    não podem ser compartilhadas entre processos, e o cache precisa começar vazio.
+    """
+    global _pool, _writer
+    with _pool_lock:
+        # A thread escritora não sobrevive ao fork
+        _pool = None
+        _writer = None
+    slow_log.reset()
+    response_cache.clear()
+
+def get_db_connection(readonly=None):
+    """
+    Empresta uma conexão do pool (usar com 'with'). Sem 'readonly', segue a
+    classe da operação SOAP em andamento: leituras recebem conexão query_only.
+    """
+    if readonly is None:
+        timer = metrics.current_request()
+        readonly = timer is not None and timer.kind == 'read'
+    return get_pool().connection(readonly)
+
+# ============ MÉTRICAS ============
+
+registry = metrics.Registry()
+REQUESTS_TOTAL = registry.counter(
+    'soap_requests_total', 'Requisições SOAP por operação e status HTTP', ('operation', 'status'))
+REQUEST_DURATION = registry.histogram(
+    'soap_request_duration_seconds', 'Tempo total da requisição SOAP', ('operation',))
+PHASE_DURATION = registry.histogram(
+    'soap_request_phase_seconds', 'Tempo por fase da requisição (parse, queue, sql, serialize)', ('operation', 'phase'))
+FAULTS_TOTAL = registry.counter(
+    'soap_faults_total', 'SOAP Faults emitidos por faultstring', ('fault',))
+SQL_DURATION = registry.histogram(
+    'soap_sql_statement_seconds', 'Tempo de execução por comando SQL', ('statement',))
+ADMISSION_REJECTED = registry.counter(
+    'soap_admission_rejected_total', 'Requisições recusadas pelo controle de admissão', ('kind', 'reason'))
+RESPONSE_BYTES = registry.histogram(
+    'soap_response_bytes', 'Tamanho do corpo da resposta', ('operation',), buckets=metrics.SIZE_BUCKETS)
+
+_statement_labels = {}
+_IN_LIST = re.compile(r'\(\?(?:,\s*\?)+\)')
+
+def statement_label(sql):
+    """Forma normalizada (e limitada) de um comando SQL para usar como label"""
+    label = _statement_labels.get(sql)
+    if label is None:
+        label = _IN_LIST.sub('(?...)', ' '.join(sql.split()))[:160]
+        if len(_statement_labels) < 1024:
+            _statement_labels[sql] = label
+    return label
+
+def observe_sql(sql, seconds, fetch=False):
+    """
+    Observador do pool: registra o tempo de cada comando SQL. O tempo de
+    busca das linhas entra na fase 'sql' da requisição, mas não gera uma
+    nova observação no histograma por comando.
+    """
+    timer = metrics.current_request()
+    if timer is not None:
+        timer.sql_seconds += seconds
+        if timer.statements is not None:
+            timer.track_statement(sql, seconds, fetch)
+    if fetch:
+        return
+    SQL_DURATION.observe(seconds, statement=statement_label(sql))
+    if timer is not None:
+        timer.sql_statements += 1
+
+def fault_label(message):
+    """Agrupa faultstrings com detalhes variáveis ('Malformed SOAP request: ...')"""
+    return message.split(':', 1)[0][:80]
+
+def record_request(timer, operation, status, size):
+    """Fecha as métricas de uma requisição SOAP; retorna o tempo de cada fase"""
+    total = time.perf_counter() - timer.started
+    phases = {
+        'parse': timer.parse_seconds,
+        'queue': timer.queue_seconds,
+        'sql': timer.sql_seconds,
+    }
+    phases['serialize'] = max(total - sum(phases.values()), 0.0)
+    REQUESTS_TOTAL.inc(operation=operation, status=status)
+    REQUEST_DURATION.observe(total, operation=operation)
+    for phase, seconds in phases.items():
+        PHASE_DURATION.observe(seconds, operation=operation, phase=phase)
+    RESPONSE_BYTES.observe(size, operation=operation)
+    phases['total'] = total
+    return phases
+
+def finish_request(timer, operation, status, size):
+    """Métricas, perfil (se a requisição foi sorteada) e log de operações lentas"""
+    try:
+        phases = record_request(timer, operation, status, size)
+        total_ms = round(phases['total'] * 1000.0, 3)
+        profile_id = None
+        if timer.profile is not None:
+            profile_id = profiler.finish(timer.profile, operation, status, total_ms)
+            timer.profile = None
+        if slow_log.enabled and total_ms >= slow_log.threshold_ms:
+            entry = {
+                'timestamp': datetime.now().isoformat(timespec='milliseconds'),
+                'operation': operation,
+                'status': status,
+                'response_bytes': size,
+            }
+            entry.update((f'{phase}_ms', round(seconds * 1000.0, 3)) for phase, seconds in phases.items())
+            entry['sql_statements'] = timer.sql_statements
+            entry['params'] = {name: profiling.clip(value) for name, value in (timer.params or {}).items()}
+            entry['profile_id'] = profile_id
+            slow_log.submit(entry, timer.statements)
+    finally:
+        metrics.end_request()
+
+def instrument_response(timer, operation, response):
+    """
+    Registra as métricas da resposta. Respostas em streaming só são
+    contabilizadas quando o último bloco é enviado.
+    """
+    if not response.is_streamed:
+        finish_request(timer, operation, response.status_code, response.content_length or 0)
+        return response
+    
+    body = response.response
+    status = response.status_code
+    size = 0
+    finished = False
+    
+    def finish():
+        # Fim do corpo ou close() sem o corpo ter sido lido: fecha uma vez só
+        nonlocal finished
+        if not finished:
+            finished = True
+            finish_request(timer, operation, status, size)
+    
+    def counted():
+        nonlocal size
+        try:
+            for chunk in body:
+                size += len(chunk)
+                yield chunk
+        finally:
+            finish()
+    
+    response.response = counted()
+    response.call_on_close(finish)
+    return response
+
+def pool_and_cache_metrics():
+    """Coletor: estado do pool de conexões e do cache de respostas"""
+    pool = get_pool().stats()
+    cache = response_cache.stats()
+    return [
+        ('guild_db_pool_open_connections', 'gauge', 'Conexões SQLite abertas', pool['opened']),
+        ('guild_db_pool_in_use', 'gauge', 'Conexões emprestadas no momento', pool['in_use']),
+        ('guild_db_pool_waits_total', 'counter', 'Esperas por conexão livre', pool['waits']),
+        ('guild_db_pool_timeouts_total', 'counter', 'Esperas que estouraram o tempo limite', pool['timeouts']),
+        ('guild_cache_entries', 'gauge', 'Respostas em cache', cache['entries']),
+        ('guild_cache_hits_total', 'counter', 'Acertos do cache de respostas', cache['hits']),
+        ('guild_cache_misses_total', 'counter', 'Faltas do cache de respostas', cache['misses']),
+        ('guild_cache_evictions_total', 'counter', 'Evicções do cache de respostas', cache['evictions']),
+    ] + writer_metrics()
+
+def writer_metrics():
+    if _writer is None:
+        return []
+    writer = _writer.stats()
+    return [
+        ('guild_group_commit_batches_total', 'counter', 'Transações do group commit', writer['batches']),
+        ('guild_group_commit_operations_total', 'counter', 'Operações confirmadas em lote', writer['operations']),
+        ('guild_group_commit_rejected_total', 'counter', 'Operações recusadas com a fila cheia', writer['rejected']),
+        ('guild_group_commit_queued', 'gauge', 'Operações esperando o próximo lote', writer['queued']),
+    ]
+
+registry.add_collector(pool_and_cache_metrics)
+
+def admission_metrics():
+    """Coletor: operações em andamento e na fila, por classe"""
+    samples = []
+    for kind, limiter in admission_limiters.items():
+        stats = limiter.stats()
+        samples.append((f'guild_admission_{kind}_active', 'gauge',
+                        f'Operações de {kind} em andamento', stats['active']))
+        samples.append((f'guild_admission_{kind}_waiting', 'gauge',
+                        f'Operações de {kind} esperando vaga', stats['waiting']))
+    return samples
+
+registry.add_collector(admission_metrics)
+
+# ============ PROFILING E OPERAÇÕES LENTAS ============
+
+_explain_local = threading.local()
+
+def explain_statement(sql):
+    """
+    EXPLAIN QUERY PLAN de um comando já executado, com NULL no lugar de cada
+    parâmetro. Roda na thread do log, em uma conexão própria sem observador
+    (para não aparecer nas métricas de SQL).
+    """
+    if not sql.lstrip().upper().startswith(('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH')):
+        return None
+    conn = getattr(_explain_local, 'conn', None)
+    if conn is None:
+        conn = _explain_local.conn = sqlite3.connect(DB_PATH, uri=True, factory=TimedConnection)
+    if 'characters_db.' in sql:
+        attach_characters_db(conn)
+    rows = conn.execute('EXPLAIN QUERY PLAN ' + sql, (None,) * sql.count('?')).fetchall()
+    return [row[-1] for row in rows]
+
+def slow_logger():
+    """Logger das operações lentas: uma linha JSON por entrada"""
+    logger = logging.getLogger('guild.slow')
+    if not logger.handlers:
+        handler = logging.FileHandler(SLOW_LOG_PATH) if SLOW_LOG_PATH else logging.StreamHandler()
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger.addHandler(handler)
+        logger.propagate = False
+    return logger
+
+profiler = profiling.RequestProfiler(PROFILE_SAMPLE_RATE, PROFILE_OPERATION, PROFILE_RING_SIZE)
+slow_log = profiling.SlowOperationLog(SLOW_OPERATION_MS, slow_logger(), explain=explain_statement)
+
+class GuildOperationError(Exception):
+    """Falha de negócio de uma operação (vira SOAP Fault ou falha de item)"""
+
+
+@lru_cache(maxsize=1)
+def wsdl_document():
+    """WSDL gerado a partir do registro de operações: (bytes, ETag)"""
+    body = OPERATIONS.render_wsdl(WSDL_LOCATION).encode('utf-8')
+    return body, make_etag(body)
 
 @app.route('/', methods=['GET'])
 def wsdl():
-    """Retorna o WSDL"""
-    return Response(WSDL_TEMPLATE, mimetype='text/xml')
+    """Retorna o WSDL (com ETag; 304 quando o cliente já tem a versão atual)"""
+    body, etag = wsdl_document()
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        response = encode_response(xml_response(body))
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
 
 @app.route('/soap', methods=['POST'])
 def soap_service():
     """Processa requisições SOAP"""
+    timer = metrics.begin_request()
+    if slow_log.enabled:
+        timer.statements = {}
+    operation = 'unknown'
     try:
-        soap_request = request.data.decode('utf-8')
-        
-        # Parse simples do SOAP (para demonstração)
-        if 'get_all_guilds' in soap_request:
-            return handle_get_all_guilds()
-        elif 'get_guild_by_id' in soap_request:
-            return handle_get_guild_by_id(soap_request)
-        elif 'create_guild' in soap_request:
-            return handle_create_guild(soap_request)
-        elif 'join_guild' in soap_request:
-            return handle_join_guild(soap_request)
-        elif 'get_guild_members' in soap_request:
-            return handle_get_guild_members(soap_request)
+        try:
+            soap_request = parse_soap_request(request.get_data(), request.headers.get('SOAPAction'))
+        except SoapParseError as e:
+            response = soap_fault(str(e))
         else:
-            return soap_fault("Unknown operation")
+            timer.mark_parsed()
+            op = OPERATIONS.get(soap_request.operation)
+            if op is None:
+                response = soap_fault("Unknown operation")
+            else:
+                operation = op.name
+                timer.kind = op.kind
+                timer.params = soap_request.params
+                if profiler.enabled:
+                    timer.profile = profiler.start(operation)
+                response = run_admitted(timer, op, soap_request)
             
     except Exception as e:
+        response = soap_fault(str(e))
+    
+    return instrument_response(timer, operation, encode_response(response))
+
+def client_deadline():
+    """Prazo (time.monotonic) pedido pelo cliente no cabeçalho, ou None"""
+    value = request.headers.get(DEADLINE_HEADER)
+    if not value:
+        return None
+    try:
+        return time.monotonic() + float(value) / 1000.0
+    except ValueError:
+        return None
+
+def run_admitted(timer, op, soap_request):
+    """
+    Valida os parâmetros e executa o handler dentro do limite de concorrência
+    da sua classe. Sem vaga dentro do prazo, responde na hora com um fault 503
+    e Retry-After. Respostas em streaming mantêm a vaga até o último bloco.
+    """
+    # Parâmetros inválidos são recusados antes de ocupar uma vaga
+    try:
+        args = op.coerce(soap_request.params)
+    except ParamError as e:
         return soap_fault(str(e))
+    
+    limiter = admission_limiters[op.kind]
+    started = time.perf_counter()
+    try:
+        ticket = limiter.acquire(client_deadline())
+    except admission.Overloaded as e:
+        ADMISSION_REJECTED.inc(kind=limiter.name, reason=e.reason)
+        return overloaded_fault(str(e))
+    finally:
+        timer.queue_seconds = time.perf_counter() - started
+    
+    try:
+        response = op.handler(soap_request, args)
+    except BaseException:
+        ticket.release()
+        raise
+    if response.is_streamed:
+        # Libera ao fim do corpo ou no close() da resposta, o que vier primeiro
+        response.response = release_when_done(response.response, ticket)
+        response.call_on_close(ticket.release)
+    else:
+        ticket.release()
+    return response
 
-# Funções auxiliares para parsing SOAP
-import re
+def overloaded_fault(message):
+    """Fault 503 com Retry-After: o cliente deve recuar e tentar de novo"""
+    response = soap_fault(message, status=503)
+    response.headers['Retry-After'] = RETRY_AFTER_SECONDS
+    return response
 
-def extract_soap_value(xml, tag):
-    """Extrai valor de uma tag XML de forma simples"""
-    pattern = f'<{tag}>(.*?)</{tag}>'
-    match = re.search(pattern, xml)
-    return match.group(1) if match else None
+def release_when_done(body, ticket):
+    try:
+        yield from body
+    finally:
+        ticket.release()
 
 def create_soap_response(operation, content):
-    """Cria resposta SOAP padronizada"""
-    return f'''<?xml version="1.0" encoding="UTF-8"?>
-<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/"
-               xmlns:tns="http://ashennetwork.soap/guild">
-    <soap:Body>
-        <tns:{operation}Response>
-            {content}
-        </tns:{operation}Response>
-    </soap:Body>
-</soap:Envelope>'''
-
-def handle_get_all_guilds():
-    """Lista todas as guildas"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT id, name, description, leader, member_count FROM guilds')
-    guilds = cursor.fetchall()
-    conn.close()
-    
-    guilds_xml = ""
-    for guild in guilds:
-        guilds_xml += f'''
-            <guild>
-                <id>{guild[0]}</id>
-                <name>{guild[1]}</name>
-                <description>{guild[2]}</description>
-                <leader>{guild[3]}</leader>
-                <member_count>{guild[4]}</member_count>
-            </guild>'''
-    
-    return Response(create_soap_response('get_all_guilds', guilds_xml), mimetype='text/xml')
-
-def handle_get_guild_by_id(soap_request):
+    """Cria resposta SOAP padronizada (bytes)"""
+    return serializer.envelope(operation, content)
+
+def xml_response(body, status=200):
+    return Response(body, status=status, content_type='text/xml; charset=utf-8')
+
+def encode_response(response):
+    """
+    Comprime o corpo com gzip/deflate quando o cliente aceita.
+    Respostas já codificadas, vazias ou pequenas demais seguem como estão.
+    """
+    if response.status_code == 304 or 'Content-Encoding' in response.headers:
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = serializer.negotiate_encoding(request.headers.get('Accept-Encoding'))
+    if encoding is None:
+        return response
+    
+    if response.is_streamed:
+        response.response = serializer.compress_stream(response.response, encoding)
+    else:
+        body = response.get_data()
+        if len(body) < serializer.MIN_COMPRESS_SIZE:
+            return response
+        response.set_data(serializer.compress(body, encoding))
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+def iter_keyset_pages(sql, args, after_id, page_size, prepare=None):
+    """
+    Percorre uma consulta em lotes por cursor de chave. 'sql' recebe
+    (*args, after_id, limit) e deve ordenar pelo id, a primeira coluna.
+    A conexão é emprestada apenas durante cada lote, nunca durante o envio.
+    Gera (linhas, id_do_ultimo) e termina ao esgotar page_size ou a consulta.
+    """
+    remaining = page_size
+    last_id = after_id
+    while remaining is None or remaining > 0:
+        limit = STREAM_CHUNK_SIZE if remaining is None else min(STREAM_CHUNK_SIZE, remaining)
+        with get_db_connection() as conn:
+            if prepare is not None:
+                prepare(conn)
+            rows = conn.execute(sql, (*args, last_id, limit)).fetchall()
+        if not rows:
+            return
+        last_id = rows[-1][0]
+        if remaining is not None:
+            remaining -= len(rows)
+        yield rows, last_id
+        if len(rows) < limit:
+            return
+
+def iter_guild_pages(after_id, page_size):
+    """Lotes da tabela de guildas (id > after_id)"""
+    return iter_keyset_pages(
+        'SELECT id, name, description, leader, member_count FROM guilds '
+        'WHERE id > ? ORDER BY id LIMIT ?', (), after_id, page_size)
+
+def handle_get_all_guilds(soap_request, args):
+    """
+    Lista as guildas em streaming, paginadas por cursor.
+    Parâmetros opcionais: page_size (máx. MAX_PAGE_SIZE) e after_id.
+    Sem page_size toda a tabela é enviada, em lotes, sem acumular em memória.
+    """
+    page_size, after_id = args['page_size'], args['after_id']
+    
+    def generate():
+        prefix, suffix = serializer.envelope_parts('get_all_guilds')
+        yield prefix
+        last_id = None
+        for rows, last_id in iter_guild_pages(after_id, page_size):
+            yield serializer.guild_rows(rows).encode('utf-8')
+        
+        # Cursor da próxima página, apenas quando ainda há guildas depois desta
+        if page_size is not None and last_id is not None:
+            with get_db_connection() as conn:
+                has_more = conn.execute('SELECT 1 FROM guilds WHERE id > ? LIMIT 1', (last_id,)).fetchone()
+            if has_more:
+                yield f'<next_after_id>{last_id}</next_after_id>'.encode('utf-8')
+        yield suffix
+    
+    return xml_response(generate())
+
+def cached_response(operation, guild_id, build):
+    """
+    Devolve a resposta de (operation, guild_id) a partir do cache,
+    chamando build() para montar o conteúdo em caso de miss.
+    Responde 304 quando o If-None-Match do cliente bate com o ETag.
+    """
+    key = (operation, guild_id)
+    entry = response_cache.get(key)
+    if entry is None:
+        epoch = response_cache.epoch
+        try:
+            content = build()
+        except GuildOperationError as e:
+            return soap_fault(str(e))
+        entry = response_cache.put(key, create_soap_response(operation, content), epoch)
+    
+    # ETag fraca: a mesma para as variantes comprimidas e sem compressão
+    if request.if_none_match.contains_weak(entry.etag):
+        response = Response(status=304)
+    else:
+        encoding = serializer.negotiate_encoding(request.headers.get('Accept-Encoding'))
+        if encoding is None or len(entry.body) < serializer.MIN_COMPRESS_SIZE:
+            response = xml_response(entry.body)
+        else:
+            # A variante comprimida fica guardada na própria entrada do cache
+            body = entry.encoded.get(encoding)
+            if body is None:
+                body = entry.encoded[encoding] = serializer.compress(entry.body, encoding)
+            response = xml_response(body)
+            response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+    response.set_etag(entry.etag, weak=True)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def invalidate_guilds(guild_ids):
+    """Invalida as respostas em cache das guildas alteradas e acorda o feed de alterações"""
+    keys = [(operation, guild_id) for guild_id in guild_ids for operation in CACHED_OPERATIONS]
+    if keys:
+        response_cache.invalidate(*keys)
+        change_notifier.notify()
+
+def handle_get_guild_by_id(soap_request, args):
     """Busca guilda por ID"""
-    guild_id = extract_soap_value(soap_request, 'guild_id')
-    if not guild_id:
-        return soap_fault("Invalid guild_id")
-    
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT id, name, description, leader, member_count FROM guilds WHERE id = ?', (guild_id,))
-    guild = cursor.fetchone()
-    conn.close()
-    
-    if not guild:
-        return soap_fault("Guild not found")
-    
-    guild_xml = f'''
-        <guild>
-            <id>{guild[0]}</id>
-            <name>{guild[1]}</name>
-            <description>{guild[2]}</description>
-            <leader>{guild[3]}</leader>
-            <member_count>{guild[4]}</member_count>
-        </guild>'''
-    
-    return Response(create_soap_response('get_guild_by_id', guild_xml), mimetype='text/xml')
-
-def handle_create_guild(soap_request):
-    """Cria nova guilda"""
-    name = extract_soap_value(soap_request, 'name')
-    description = extract_soap_value(soap_request, 'description') 
-    leader = extract_soap_value(soap_request, 'leader')
+    guild_id = args['guild_id']
+    
+    def build():
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT id, name, description, leader, member_count FROM guilds WHERE id = ?', (guild_id,))
+            guild = cursor.fetchone()
+        
+        if not guild:
+            raise GuildOperationError("Guild not found")
+        
+        return serializer.guild_rows([guild])
+    
+    return cached_response('get_guild_by_id', guild_id, build)
+
+def today():
+    return datetime.now().strftime('%Y-%m-%d')
+
+def create_guild_item(cursor, params):
+    """Cria uma guilda e registra o líder como membro; retorna (XML, guild_id)"""
+    name = params.get('name')
+    description = params.get('description')
+    leader = params.get('leader')
     
     if not all([name, description, leader]):
+        raise GuildOperationError("Missing required fields")
+    
+    # member_count começa em 0: o trigger de guild_members conta o líder
+    try:
+        cursor.execute('INSERT INTO guilds (name, description, leader, member_count) VALUES (?, ?, ?, 0)', 
+                      (name, description, leader))
+    except sqlite3.IntegrityError:
+        raise GuildOperationError("Guild name already exists") from None
+    guild_id = cursor.lastrowid
+    
+    # Adiciona o líder como membro
+    cursor.execute('INSERT INTO guild_members (character_name, guild_id, rank, join_date) VALUES (?, ?, ?, ?)', 
+                  (leader, guild_id, 'Leader', today()))
+    
+    return serializer.guild_rows([(guild_id, name, description, leader, 1)]), guild_id
+
+def join_guild_item(cursor, params):
+    """Adiciona um personagem à guilda; retorna (XML, guild_id)"""
+    guild_id = params.get('guild_id')
+    character_name = params.get('character_name')
+    
+    # guild_id chega como texto dentro de <batch> e já convertido em join_guild
+    if guild_id in (None, '') or not character_name:
+        raise GuildOperationError("Missing required fields")
+    try:
+        guild_id = int(guild_id)
+    except ValueError:
+        raise GuildOperationError("Invalid guild_id") from None
+    
+    # Um único INSERT atômico: só insere se a guilda existir, e o índice único
+    # (guild_id, character_name) descarta duplicatas. O member_count é
+    # atualizado pelo trigger de guild_members.
+    cursor.execute('''
+        INSERT INTO guild_members (character_name, guild_id, rank, join_date)
+        SELECT ?, id, 'Member', ? FROM guilds WHERE id = ?
+        ON CONFLICT (guild_id, character_name) DO NOTHING
+    ''', (character_name, today(), guild_id))
+    
+    if cursor.rowcount == 0:
+        # Caminho de falha: descobre o motivo
+        cursor.execute('SELECT 1 FROM guilds WHERE id = ?', (guild_id,))
+        if not cursor.fetchone():
+            raise GuildOperationError("Guild not found")
+        raise GuildOperationError("Character already in guild")
+    
+    return serializer.element('message', f'Character {character_name} joined guild successfully'), guild_id
+
+def submit_write(item_function, params):
+    """
+    Envia a operação para o group commit e espera o commit do lote.
+    A espera conta como tempo de SQL da requisição.
+    """
+    started = time.perf_counter()
+    try:
+        return get_writer().submit(item_function, params)
+    finally:
+        timer = metrics.current_request()
+        if timer is not None:
+            timer.sql_seconds += time.perf_counter() - started
+
+def run_write_operation(operation, item_function, params):
+    """
+    Executa uma operação de escrita em sua própria transação ou, com
+    GUILDS_GROUP_COMMIT ligado, no próximo lote da thread escritora.
+    """
+    try:
+        if GROUP_COMMIT:
+            content, guild_id = submit_write(item_function, params)
+        else:
+            with get_db_connection() as conn:
+                content, guild_id = item_function(conn.cursor(), params)
+                conn.commit()
+    except GuildOperationError as e:
+        return soap_fault(str(e))
+    except WriterBusy as e:
+        # Fila do group commit cheia: mesma sobrecarga que a admissão recusa
+        ADMISSION_REJECTED.inc(kind='write', reason='writer_busy')
+        return overloaded_fault(str(e))
+    
+    # Invalida somente depois do commit, para que nenhuma leitura recoloque o valor antigo
+    invalidate_guilds([guild_id])
+    
+    return xml_response(create_soap_response(operation, content))
+
+def handle_create_guild(soap_request, args):
+    """Cria nova guilda"""
+    return run_write_operation('create_guild', create_guild_item, args)
+
+def handle_join_guild(soap_request, args):
+    """Adiciona personagem à guilda"""
+    return run_write_operation('join_guild', join_guild_item, args)
+
+def handle_get_guild_members(soap_request, args):
+    """Lista membros da guilda"""
+    guild_id = args['guild_id']
+    
+    def build():
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT id, character_name, guild_id, rank, join_date FROM guild_members WHERE guild_id = ? ORDER BY id', (guild_id,))
+            members = cursor.fetchall()
+        
+        return serializer.member_rows(members)
+    
+    return cached_response('get_guild_members', guild_id, build)
+
+_SEARCH_TERM = re.compile(r'\w+')
+
+def fts_query(text):
+    """
+    Converte o texto livre do usuário em uma consulta FTS5 segura: cada
+    palavra vira um termo entre aspas com busca por prefixo, todos obrigatórios.
+    Operadores e aspas do usuário nunca chegam à sintaxe do FTS.
+    """
+    terms = _SEARCH_TERM.findall(text or '')
+    return ' '.join(f'"{term}"*' for term in terms)
+
+def handle_search_guilds(soap_request, args):
+    """
+    Busca guildas por palavras no nome e na descrição (índice FTS5),
+    ordenadas por relevância (bm25, nome pesa mais). Parâmetro opcional: limit.
+    """
+    query = fts_query(args['query'])
+    if not query:
         return soap_fault("Missing required fields")
+    limit = args['limit']
     
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    with get_db_connection() as conn:
+        rows = conn.execute('''
+            SELECT g.id, g.name, g.description, g.leader, g.member_count
+            FROM guilds_fts JOIN guilds g ON g.id = guilds_fts.rowid
+            WHERE guilds_fts MATCH ?
+            ORDER BY bm25(guilds_fts, 10.0, 1.0)
+            LIMIT ?
+        ''', (query, limit)).fetchall()
     
+    return xml_response(create_soap_response('search_guilds', serializer.guild_rows(rows)))
+
+# ============ ELENCO COM DADOS DOS PERSONAGENS ============
+
+ROSTER_SQL = '''
+    SELECT m.id, m.character_name, m.guild_id, m.rank, m.join_date,
+           c.id, c.level,
+           (SELECT COUNT(*) FROM characters_db.character_items ci WHERE ci.character_id = c.id)
+    FROM guild_members m
+    LEFT JOIN characters_db.characters c ON c.id = (
+        SELECT id FROM characters_db.characters WHERE name = m.character_name ORDER BY id LIMIT 1
+    )
+    WHERE m.guild_id = ? AND m.id > ?
+    ORDER BY m.id
+    LIMIT ?
+'''
+
+def attach_characters_db(conn):
+    """Anexa dark_souls.db (somente leitura) uma vez por conexão do pool"""
+    if getattr(conn, 'characters_attached', False):
+        return
+    uri = pathlib.Path(CHARACTERS_DB_PATH).resolve().as_uri() + '?mode=ro'
     try:
-        cursor.execute('INSERT INTO guilds (name, description, leader, member_count) VALUES (?, ?, ?, 1)', 
-                      (name, description, leader))
-        guild_id = cursor.lastrowid
+        conn.execute('ATTACH DATABASE ? AS characters_db', (uri,))
+    except sqlite3.OperationalError:
+        raise GuildOperationError("Character database unavailable") from None
+    conn.characters_attached = True
+
+def handle_get_guild_roster(soap_request, args):
+    """
+    Membros da guilda com nível e quantidade de itens de cada personagem,
+    em uma única consulta sobre o banco de personagens anexado.
+    Paginado como get_all_guilds (page_size/after_id, <next_after_id>);
+    sem page_size o elenco inteiro é enviado em streaming.
+    """
+    guild_id, page_size, after_id = args['guild_id'], args['page_size'], args['after_id']
+    try:
+        # Falha de ATTACH vira fault antes de o streaming começar
+        with get_db_connection() as conn:
+            attach_characters_db(conn)
+    except GuildOperationError as e:
+        return soap_fault(str(e))
+    
+    def generate():
+        prefix, suffix = serializer.envelope_parts('get_guild_roster')
+        yield prefix
+        last_id = None
+        for rows, last_id in iter_keyset_pages(ROSTER_SQL, (guild_id,), after_id, page_size,
+                                               prepare=attach_characters_db):
+            yield serializer.roster_rows(rows).encode('utf-8')
         
-        # Adiciona o líder como membro
-        cursor.execute('INSERT INTO guild_members (character_name, guild_id, rank, join_date) VALUES (?, ?, ?, ?)', 
-                      (leader, guild_id, 'Leader', datetime.now().strftime('%Y-%m-%d')))
+        if page_size is not None and last_id is not None:
+            with get_db_connection() as conn:
+                has_more = conn.execute('SELECT 1 FROM guild_members WHERE guild_id = ? AND id > ? LIMIT 1',
+                                        (guild_id, last_id)).fetchone()
+            if has_more:
+                yield f'<next_after_id>{last_id}</next_after_id>'.encode('utf-8')
+        yield suffix
+    
+    return xml_response(generate())
+
+# ============ FEED DE ALTERAÇÕES ============
+
+def fetch_changes(conn, after_version, limit):
+    return conn.execute(
+        'SELECT version, type, guild_id, character_name, changed_at FROM guild_changes '
+        'WHERE version > ? ORDER BY version LIMIT ?', (after_version, limit)).fetchall()
+
+def current_change_version(conn):
+    return conn.execute('SELECT COALESCE(MAX(version), 0) FROM guild_changes').fetchone()[0]
+
+def handle_get_changes_since(soap_request, args):
+    """
+    Alterações com versão maior que 'version' (padrão 0), em ordem.
+    <current_version> indica a última versão existente: enquanto a última
+    <change> recebida for menor, há mais páginas.
+    Tipos: guild_created, member_joined e resync (importação em massa;
+    o consumidor deve recarregar tudo).
+    """
+    version, limit = args['version'], args['limit']
+    
+    with get_db_connection() as conn:
+        rows = fetch_changes(conn, version, limit)
+        current = current_change_version(conn)
+    
+    content = serializer.change_rows(rows) + serializer.element('current_version', current)
+    return xml_response(create_soap_response('get_changes_since', content))
+
+@app.route('/changes/stream', methods=['GET'])
+def changes_stream():
+    """
+    Server-Sent Events com as alterações conforme acontecem. Retoma a partir
+    do Last-Event-ID (ou ?since=versão); sem nenhum dos dois, envia só as novas.
+    """
+    since = request.headers.get('Last-Event-ID') or request.args.get('since')
+    try:
+        since = int(since) if since else None
+    except ValueError:
+        return jsonify({'error': 'Invalid since'}), 400
+    
+    # Antes de ocupar a vaga: se a consulta falhar, não há vaga a devolver
+    if since is None:
+        with get_db_connection(readonly=True) as conn:
+            since = current_change_version(conn)
+    
+    if not sse_subscribers.acquire():
+        response = jsonify({'error': 'Too many change stream subscribers'})
+        response.status_code = 503
+        response.headers['Retry-After'] = '5'
+        return response
+    
+    def generate():
+        last_version = since
+        last_sent = time.monotonic()
+        yield b'retry: 2000\n\n'
+        while True:
+            # A sequência é lida antes da consulta para não perder um aviso no meio
+            seen = change_notifier.sequence
+            with get_db_connection(readonly=True) as conn:
+                rows = fetch_changes(conn, last_version, STREAM_CHUNK_SIZE)
+            if rows:
+                last_version = rows[-1][0]
+                last_sent = time.monotonic()
+                yield b''.join(change_feed.sse_event(row) for row in rows)
+                if len(rows) == STREAM_CHUNK_SIZE:
+                    continue
+            # Acorda com escritas deste processo; as de outros processos chegam pela consulta periódica
+            change_notifier.wait(seen, CHANGE_POLL_SECONDS)
+            if time.monotonic() - last_sent >= SSE_HEARTBEAT_SECONDS:
+                last_sent = time.monotonic()
+                yield change_feed.sse_comment('keepalive')
+    
+    response = Response(generate(), content_type='text/event-stream; charset=utf-8')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    response.call_on_close(sse_subscribers.release)
+    return response
+
+# ============ OPERAÇÕES EM LOTE ============
+
+def select_in_chunks(conn, sql, values):
+    """Executa 'sql' (com {placeholders}) em blocos de SQL_IN_CHUNK_SIZE valores"""
+    values = list(values)
+    for start in range(0, len(values), SQL_IN_CHUNK_SIZE):
+        chunk = values[start:start + SQL_IN_CHUNK_SIZE]
+        placeholders = ','.join('?' * len(chunk))
+        yield from conn.execute(sql.format(placeholders=placeholders), chunk)
+
+def format_batch_result(index, content=None, fault=None, operation=None):
+    """Serializa o resultado de um item do lote"""
+    operation_xml = f'<operation>{operation}</operation>' if operation else ''
+    if fault is not None:
+        return (f'<result><index>{index}</index>{operation_xml}<status>fault</status>'
+                f'<faultstring>{escape(fault)}</faultstring></result>')
+    return f'<result><index>{index}</index>{operation_xml}<status>ok</status>{content}</result>'
+
+def batch_response(operation, results):
+    """Monta a resposta de um lote a partir de [(xml, ok)]"""
+    succeeded = sum(1 for _, ok in results if ok)
+    content = (
+        '<results>' + ''.join(xml for xml, _ in results) + '</results>'
+        f'<succeeded>{succeeded}</succeeded><failed>{len(results) - succeeded}</failed>'
+    )
+    return xml_response(create_soap_response(operation, content))
+
+def handle_bulk_create_guilds(soap_request, args):
+    """
+    Cria várias guildas (<guild><name/><description/><leader/></guild>)
+    em uma única transação com executemany.
+    """
+    items = [element_params(elem) for elem in iter_children(soap_request.element, 'guild')]
+    if not items:
+        return soap_fault("Missing required fields")
+    if len(items) > MAX_BATCH_ITEMS:
+        return soap_fault("Batch too large")
+    
+    faults = {}
+    pending = []
+    seen = set()
+    for index, item in enumerate(items):
+        name, description, leader = item.get('name'), item.get('description'), item.get('leader')
+        if not all([name, description, leader]):
+            faults[index] = "Missing required fields"
+        elif name in seen:
+            faults[index] = "Guild name already exists"
+        else:
+            seen.add(name)
+            pending.append((index, name, description, leader))
+    
+    created = {}
+    with get_db_connection() as conn:
+        # Reserva a escrita já no início: a checagem e os inserts não podem ser intercalados
+        conn.execute('BEGIN IMMEDIATE')
+        existing = {row[0] for row in select_in_chunks(
+            conn, 'SELECT name FROM guilds WHERE name IN ({placeholders})', [p[1] for p in pending])}
+        for index, name, _, _ in pending:
+            if name in existing:
+                faults[index] = "Guild name already exists"
+        pending = [p for p in pending if p[0] not in faults]
         
+        conn.executemany('INSERT INTO guilds (name, description, leader, member_count) VALUES (?, ?, ?, 0)',
+                         [(name, description, leader) for _, name, description, leader in pending])
+        ids = dict(select_in_chunks(
+            conn, 'SELECT name, id FROM guilds WHERE name IN ({placeholders})', [p[1] for p in pending]))
+        join_date = today()
+        conn.executemany('INSERT INTO guild_members (character_name, guild_id, rank, join_date) VALUES (?, ?, ?, ?)',
+                         [(leader, ids[name], 'Leader', join_date) for _, name, _, leader in pending])
         conn.commit()
-        conn.close()
         
-        guild_xml = f'''
-            <guild>
-                <id>{guild_id}</id>
-                <name>{name}</name>
-                <description>{description}</description>
-                <leader>{leader}</leader>
-                <member_count>1</member_count>
-            </guild>'''
-        
-        return Response(create_soap_response('create_guild', guild_xml), mimetype='text/xml')
-        
-    except sqlite3.IntegrityError:
-        conn.close()
-        return soap_fault("Guild name already exists")
-
-def handle_join_guild(soap_request):
-    """Adiciona personagem à guilda"""
-    guild_id = extract_soap_value(soap_request, 'guild_id')
-    character_name = extract_soap_value(soap_request, 'character_name')
+        for index, name, description, leader in pending:
+            created[index] = serializer.guild_rows([(ids[name], name, description, leader, 1)])
     
-    if not all([guild_id, character_name]):
+    invalidate_guilds(ids.values())
+    
+    results = []
+    for index in range(len(items)):
+        if index in faults:
+            results.append((format_batch_result(index, fault=faults[index]), False))
+        else:
+            results.append((format_batch_result(index, created[index]), True))
+    return batch_response('bulk_create_guilds', results)
+
+def handle_bulk_join_guild(soap_request, args):
+    """
+    Adiciona vários personagens (<member><guild_id/><character_name/></member>)
+    em uma única transação com executemany. Um <guild_id> direto na operação
+    vale para os membros que não informarem o seu.
+    """
+    default_guild_id = args['guild_id']
+    items = [element_params(elem) for elem in iter_children(soap_request.element, 'member')]
+    if not items:
         return soap_fault("Missing required fields")
+    if len(items) > MAX_BATCH_ITEMS:
+        return soap_fault("Batch too large")
     
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    faults = {}
+    pending = []
+    seen = set()
+    for index, item in enumerate(items):
+        guild_id = item.get('guild_id') or default_guild_id
+        character_name = item.get('character_name')
+        if not all([guild_id, character_name]):
+            faults[index] = "Missing required fields"
+            continue
+        try:
+            guild_id = int(guild_id)
+        except ValueError:
+            faults[index] = "Invalid guild_id"
+            continue
+        if (guild_id, character_name) in seen:
+            faults[index] = "Character already in guild"
+            continue
+        seen.add((guild_id, character_name))
+        pending.append((index, guild_id, character_name))
     
-    # Verifica se a guilda existe
-    cursor.execute('SELECT id FROM guilds WHERE id = ?', (guild_id,))
-    if not cursor.fetchone():
-        conn.close()
-        return soap_fault("Guild not found")
+    with get_db_connection() as conn:
+        conn.execute('BEGIN IMMEDIATE')
+        guilds = {row[0] for row in select_in_chunks(
+            conn, 'SELECT id FROM guilds WHERE id IN ({placeholders})', {p[1] for p in pending})}
+        
+        # Membros já existentes: junção com uma tabela temporária do lote
+        conn.execute('CREATE TEMP TABLE IF NOT EXISTS batch_members (guild_id INTEGER, character_name TEXT)')
+        conn.execute('DELETE FROM temp.batch_members')
+        conn.executemany('INSERT INTO temp.batch_members (guild_id, character_name) VALUES (?, ?)',
+                         [(guild_id, name) for _, guild_id, name in pending if guild_id in guilds])
+        existing = set(conn.execute('''
+            SELECT b.guild_id, b.character_name FROM temp.batch_members b
+            JOIN guild_members m ON m.guild_id = b.guild_id AND m.character_name = b.character_name
+        '''))
+        conn.execute('DELETE FROM temp.batch_members')
+        
+        for index, guild_id, name in pending:
+            if guild_id not in guilds:
+                faults[index] = "Guild not found"
+            elif (guild_id, name) in existing:
+                faults[index] = "Character already in guild"
+        pending = [p for p in pending if p[0] not in faults]
+        
+        # O member_count é atualizado pelo trigger de guild_members
+        join_date = today()
+        conn.executemany('INSERT INTO guild_members (character_name, guild_id, rank, join_date) VALUES (?, ?, ?, ?)',
+                         [(name, guild_id, 'Member', join_date) for _, guild_id, name in pending])
+        conn.commit()
     
-    # Verifica se o personagem já está na guilda
-    cursor.execute('SELECT id FROM guild_members WHERE character_name = ? AND guild_id = ?', (character_name, guild_id))
-    if cursor.fetchone():
-        conn.close()
-        return soap_fault("Character already in guild")
+    invalidate_guilds({guild_id for _, guild_id, _ in pending})
     
-    # Adiciona o membro
-    cursor.execute('INSERT INTO guild_members (character_name, guild_id, rank, join_date) VALUES (?, ?, ?, ?)', 
-                  (character_name, guild_id, 'Member', datetime.now().strftime('%Y-%m-%d')))
+    joined = {index: (guild_id, name) for index, guild_id, name in pending}
+    results = []
+    for index in range(len(items)):
+        if index in faults:
+            results.append((format_batch_result(index, fault=faults[index]), False))
+        else:
+            guild_id, name = joined[index]
+            content = f'<guild_id>{guild_id}</guild_id><character_name>{escape(name)}</character_name>'
+            results.append((format_batch_result(index, content), True))
+    return batch_response('bulk_join_guild', results)
+
+def handle_batch(soap_request, args):
+    """
+    Executa várias operações de escrita (<create_guild>, <join_guild>) em uma
+    única transação. Cada item roda em um SAVEPOINT: um item com falha é
+    desfeito sozinho e os demais são confirmados no commit final.
+    """
+    items = list(iter_children(soap_request.element))
+    if not items:
+        return soap_fault("Missing required fields")
+    if len(items) > MAX_BATCH_ITEMS:
+        return soap_fault("Batch too large")
     
-    # Atualiza o contador de membros
-    cursor.execute('UPDATE guilds SET member_count = member_count + 1 WHERE id = ?', (guild_id,))
+    results = []
+    touched = set()
+    with get_db_connection() as conn:
+        conn.execute('BEGIN IMMEDIATE')
+        cursor = conn.cursor()
+        for index, elem in enumerate(items):
+            operation = local_name(elem.tag)
+            item_function = BATCH_OPERATIONS.get(operation)
+            if item_function is None:
+                results.append((format_batch_result(index, fault="Unknown operation", operation=operation), False))
+                continue
+            
+            cursor.execute('SAVEPOINT batch_item')
+            try:
+                content, guild_id = item_function(cursor, element_params(elem))
+            except GuildOperationError as e:
+                cursor.execute('ROLLBACK TO batch_item')
+                cursor.execute('RELEASE batch_item')
+                results.append((format_batch_result(index, fault=str(e), operation=operation), False))
+                continue
+            cursor.execute('RELEASE batch_item')
+            touched.add(guild_id)
+            results.append((format_batch_result(index, content, operation=operation), True))
+        conn.commit()
     
-    conn.commit()
-    conn.close()
+    invalidate_guilds(touched)
     
-    message_xml = f'<message>Character {character_name} joined guild successfully</message>'
-    return Response(create_soap_response('join_guild', message_xml), mimetype='text/xml')
+    return batch_response('batch', results)
 
-def handle_get_guild_members(soap_request):
-    """Lista membros da guilda"""
-    guild_id = extract_soap_value(soap_request, 'guild_id')
-    if not guild_id:
-        return soap_fault("Invalid guild_id")
-    
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT id, character_name, guild_id, rank, join_date FROM guild_members WHERE guild_id = ?', (guild_id,))
-    members = cursor.fetchall()
-    conn.close()
-    
-    members_xml = ""
-    for member in members:
-        members_xml += f'''
-            <member>
-                <id>{member[0]}</id>
-                <character_name>{member[1]}</character_name>
-                <guild_id>{member[2]}</guild_id>
-                <rank>{member[3]}</rank>
-                <join_date>{member[4]}</join_date>
-            </member>'''
-    
-    return Response(create_soap_response('get_guild_members', members_xml), mimetype='text/xml')
-
-def soap_fault(message):
+# Operações aceitas dentro de <batch>
+BATCH_OPERATIONS = {
+    'create_guild': create_guild_item,
+    'join_guild': join_guild_item,
+}
+
+def soap_fault(message, status=500):
     """Retorna um SOAP Fault"""
-    fault = f'''<?xml version="1.0" encoding="UTF-8"?>
-<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/">
-    <soap:Body>
-        <soap:Fault>
-            <faultcode>Server</faultcode>
-            <faultstring>{message}</faultstring>
-        </soap:Fault>
-    </soap:Body>
-</soap:Envelope>'''
-    
-    return Response(fault, mimetype='text/xml', status=500)
+    FAULTS_TOTAL.inc(fault=fault_label(message))
+    return xml_response(serializer.fault(message), status=status)
+
+@app.route('/stats/pool', methods=['GET'])
+def pool_stats():
+    """Estatísticas do pool de conexões SQLite (e do group commit, se ativo)"""
+    stats = get_pool().stats()
+    if _writer is not None:
+        stats['group_commit'] = _writer.stats()
+    return jsonify(stats)
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Métricas no formato de exposição do Prometheus"""
+    return Response(registry.render(), content_type=metrics.CONTENT_TYPE)
+
+@app.route('/stats/admission', methods=['GET'])
+def admission_stats():
+    """Estatísticas do controle de admissão (leituras e escritas)"""
+    return jsonify({kind: limiter.stats() for kind, limiter in admission_limiters.items()})
+
+@app.route('/stats/cache', methods=['GET'])
+def cache_stats():
+    """Estatísticas do cache de respostas"""
+    return jsonify(response_cache.stats())
+
+def admin_only(view):
+    """Exige o token de administração (ou, sem token configurado, conexão local)"""
+    @wraps(view)
+    def guarded(*args, **kwargs):
+        if ADMIN_TOKEN:
+            allowed = hmac.compare_digest(request.headers.get(ADMIN_TOKEN_HEADER, ''), ADMIN_TOKEN)
+        else:
+            allowed = request.remote_addr in ('127.0.0.1', '::1')
+        if not allowed:
+            return jsonify({'error': 'Forbidden'}), 403
+        return view(*args, **kwargs)
+    return guarded
+
+def profiling_state():
+    return {'profiler': profiler.stats(), 'slow_log': slow_log.stats()}
+
+@app.route('/admin/profiling', methods=['GET', 'POST'])
+@admin_only
+def profiling_config():
+    """
+    Estado do profiling e do log de operações lentas. POST com JSON
+    (sample_rate, operation, max_profiles, slow_ms) muda a configuração
+    deste processo em tempo de execução; operation vazio desliga o alvo.
+    """
+    if request.method == 'POST':
+        config = request.get_json(silent=True)
+        if not isinstance(config, dict):
+            return jsonify({'error': 'Expected a JSON object'}), 400
+        operation = config.get('operation')
+        if operation and OPERATIONS.get(operation) is None:
+            return jsonify({'error': f'Unknown operation: {operation}'}), 400
+        try:
+            sample_rate = config.get('sample_rate')
+            max_profiles = config.get('max_profiles')
+            slow_ms = config.get('slow_ms')
+            profiler.configure(
+                sample_rate=None if sample_rate is None else float(sample_rate),
+                operation=operation,
+                max_profiles=None if max_profiles is None else int(max_profiles),
+            )
+            if slow_ms is not None:
+                slow_log.configure(float(slow_ms))
+        except (TypeError, ValueError) as e:
+            return jsonify({'error': str(e)}), 400
+    return jsonify(profiling_state())
+
+@app.route('/admin/profiles/<int:profile_id>', methods=['GET'])
+@admin_only
+def download_profile(profile_id):
+    """Perfil em formato pstats (.prof) ou, com ?format=text, o resumo em texto"""
+    record = profiler.get(profile_id)
+    if record is None:
+        return jsonify({'error': 'Profile not found'}), 404
+    if request.args.get('format') == 'text':
+        sort = request.args.get('sort', 'cumulative')
+        try:
+            text = record.text(sort, request.args.get('limit', 50, type=int))
+        except KeyError:
+            return jsonify({'error': f'Invalid sort: {sort}'}), 400
+        return Response(text, content_type='text/plain; charset=utf-8')
+    return Response(record.dump(), content_type='application/octet-stream', headers={
+        'Content-Disposition': f'attachment; filename="{record.operation}-{record.id}.prof"',
+    })
+
+@app.route('/admin/slow', methods=['GET'])
+@admin_only
+def slow_operations():
+    """Entradas mais recentes do log de operações lentas"""
+    return jsonify(slow_log.recent())
+
+# ============ REGISTRO DE OPERAÇÕES ============
+
+GUILD_ID = Param('guild_id', int, required=True, error="Invalid guild_id", missing="Invalid guild_id")
+PAGE_PARAMS = (
+    Param('page_size', int, minimum=1, maximum=MAX_PAGE_SIZE, error="Invalid pagination parameters"),
+    Param('after_id', int, default=0, error="Invalid pagination parameters"),
+)
+
+# Tabela de operações SOAP: despacho, validação dos parâmetros e WSDL
+OPERATIONS = OperationRegistry()
+for _operation in (
+    Operation('get_all_guilds', handle_get_all_guilds, PAGE_PARAMS,
+              description='Lista todas as guildas (page_size/after_id opcionais)'),
+    Operation('get_guild_by_id', handle_get_guild_by_id, (GUILD_ID,), cached=True,
+              description='Busca guilda por ID'),
+    Operation('create_guild', handle_create_guild, (
+        Param('name', required=True),
+        Param('description', required=True),
+        Param('leader', required=True),
+    ), write=True, description='Cria nova guilda'),
+    Operation('join_guild', handle_join_guild, (
+        Param('guild_id', int, required=True, error="Invalid guild_id"),
+        Param('character_name', required=True),
+    ), write=True, description='Adiciona personagem à guilda'),
+    Operation('get_guild_members', handle_get_guild_members, (GUILD_ID,), cached=True,
+              description='Lista membros da guilda'),
+    Operation('search_guilds', handle_search_guilds, (
+        Param('query', required=True),
+        Param('limit', int, default=SEARCH_DEFAULT_LIMIT, minimum=1, maximum=MAX_SEARCH_LIMIT,
+              error="Invalid limit"),
+    ), description='Busca guildas por palavras no nome/descrição (limit opcional)'),
+    Operation('get_changes_since', handle_get_changes_since, (
+        Param('version', int, default=0, minimum=0, error="Invalid version or limit"),
+        Param('limit', int, default=CHANGES_DEFAULT_LIMIT, minimum=1, maximum=MAX_CHANGES_LIMIT,
+              error="Invalid version or limit"),
+    ), description='Alterações a partir de uma versão (sincronização incremental)'),
+    Operation('get_guild_roster', handle_get_guild_roster, (GUILD_ID, *PAGE_PARAMS),
+              description='Membros com nível e itens dos personagens (page_size/after_id opcionais)'),
+    Operation('bulk_create_guilds', handle_bulk_create_guilds, write=True,
+              description='Cria várias guildas em uma transação',
+              extra_xsd='<xsd:element name="guild" maxOccurs="unbounded"><xsd:complexType><xsd:sequence>'
+                        '<xsd:element name="name" type="xsd:string"/>'
+                        '<xsd:element name="description" type="xsd:string"/>'
+                        '<xsd:element name="leader" type="xsd:string"/>'
+                        '</xsd:sequence></xsd:complexType></xsd:element>'),
+    Operation('bulk_join_guild', handle_bulk_join_guild, (
+        Param('guild_id', int, error="Invalid guild_id"),
+    ), write=True, description='Adiciona vários membros em uma transação',
+              extra_xsd='<xsd:element name="member" maxOccurs="unbounded"><xsd:complexType><xsd:sequence>'
+                        '<xsd:element name="guild_id" type="xsd:int" minOccurs="0"/>'
+                        '<xsd:element name="character_name" type="xsd:string"/>'
+                        '</xsd:sequence></xsd:complexType></xsd:element>'),
+    Operation('batch', handle_batch, write=True,
+              description='Executa várias operações de escrita em uma transação',
+              content_xsd='<xsd:choice maxOccurs="unbounded">'
+                          + ''.join(f'<xsd:element ref="tns:{name}"/>' for name in BATCH_OPERATIONS)
+                          + '</xsd:choice>'),
+):
+    OPERATIONS.register(_operation)
+
+# Chaves do cache de respostas invalidadas a cada escrita em uma guilda
+CACHED_OPERATIONS = tuple(OPERATIONS.names(cached=True))
+
+# O WSDL é gerado uma única vez, na importação
+wsdl_document()
 
 # Página de informações
 @app.route('/info')
@@ -374,14 +1297,17 @@ def info():
         <li><a href="/">WSDL</a> - Definição do serviço</li>
         <li><a href="/soap">SOAP Endpoint</a> - Operações SOAP</li>
         <li><a href="/info">Esta página</a> - Informações</li>
+        <li><a href="/stats/pool">Pool de conexões</a> - Estatísticas do banco</li>
+        <li><a href="/stats/cache">Cache de respostas</a> - Hits, misses e evicções</li>
+        <li><a href="/stats/admission">Admissão</a> - Operações em andamento, na fila e recusadas</li>
+        <li><a href="/metrics">Métricas</a> - Formato Prometheus</li>
+        <li><a href="/changes/stream">Feed de alterações</a> - Server-Sent Events (since/Last-Event-ID)</li>
+        <li><a href="/admin/profiling">Profiling</a> - Configuração e perfis guardados (/admin/profiles/&lt;id&gt;)</li>
+        <li><a href="/admin/slow">Operações lentas</a> - Entradas recentes do log</li>
     </ul>
     <h2>🏰 Operações Disponíveis:</h2>
     <ul>
-        <li>get_all_guilds - Lista todas as guildas</li>
-        <li>get_guild_by_id - Busca guilda por ID</li>
-        <li>create_guild - Cria nova guilda</li>
-        <li>join_guild - Adiciona personagem à guilda</li>
-        <li>get_guild_members - Lista membros da guilda</li>
+    ''' + ''.join(f'<li>{op.name} - {op.description}</li>' for op in OPERATIONS) + '''
     </ul>
     '''
 
@@ -391,6 +1317,11 @@ if __name__ == '__main__':
     print("WSDL disponível em: http://localhost:8000/")
     print("SOAP Endpoint: http://localhost:8000/soap")
     print("Info: http://localhost:8000/info")
+    print("Pool: http://localhost:8000/stats/pool")
+    print("Cache: http://localhost:8000/stats/cache")
+    print("Métricas: http://localhost:8000/metrics")
+    print("Alterações (SSE): http://localhost:8000/changes/stream")
+    print("Profiling: http://localhost:8000/admin/profiling")
     print("Porta: 8000")
     print("==========================================")
     